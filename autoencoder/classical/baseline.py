@@ -0,0 +1,306 @@
+import time
+
+import numpy as np
+from scipy.linalg import eigh
+
+from memory import peak_memory, reset_peak_memory
+
+
+class RandomizedPCA():
+    """Randomized PCA over Streamed Mini-Batches
+
+    The randomized range finder of Halko, Martinsson and Tropp applied to
+    the covariance: each pass accumulates X^T (X Q) over the batches of the
+    centered data X and orthonormalizes the (d, l) result, l being
+    n_components plus oversamples. The components are then read off the
+    (l, l) covariance restricted to that basis. Only (d, l) arrays are held
+    in memory, whatever the number N of images, and each pass costs one
+    read of the data.
+
+    Attributes:
+        n_components: number of principal components
+        oversamples: extra basis columns
+        power_iters: power iterations, one pass each, sharpening the
+            spectrum for slowly decaying singular values
+        seed: seed of the random test matrix
+        mean_: (d,) mean image
+        components_: (n_components, d) principal axes
+    """
+
+    def __init__(self, n_components=2, oversamples=10, power_iters=2,
+                 seed=0):
+        """ Init RandomizedPCA
+        """
+        self.n_components = n_components
+        self.oversamples = oversamples
+        self.power_iters = power_iters
+        self.seed = seed
+
+    def fit(self, batches):
+        """ Fit from Repeated Passes over the Data
+
+        Args:
+            batches: callable returning a fresh iterator of (B, d) batches,
+                in the same order on every pass
+
+        Returns:
+            self
+        """
+        count, total = 0, 0.
+        for x in batches():
+            count += len(x)
+            total = total + np.sum(x, axis=0, dtype=float)
+        self.mean_ = total / count
+
+        rng = np.random.RandomState(self.seed)
+        width = self.n_components + self.oversamples
+        basis = rng.normal(size=(len(self.mean_), width))
+
+        for _ in range(self.power_iters + 1):
+            # basis of the dominant range of the covariance
+            basis = np.linalg.qr(self.scatter_product(batches, basis))[0]
+
+        # principal axes of the covariance restricted to the basis
+        restricted = np.dot(basis.T, self.scatter_product(batches, basis))
+        vectors = np.linalg.eigh(restricted)[1][:, ::-1]
+        self.components_ = np.dot(basis, vectors[:, :self.n_components]).T
+
+        return self
+
+    def scatter_product(self, batches, basis):
+        """ Centered Data Transpose times the Centered Data times a Basis
+
+        Accumulated batch by batch as X^T (X basis), never forming the
+        (N, l) sketch nor the (d, d) scatter.
+
+        Returns:
+            (d, l) array
+        """
+        product = 0.
+        for x in batches():
+            centered = x - self.mean_
+            product = product + np.dot(centered.T, np.dot(centered, basis))
+
+        return product
+
+    def transform(self, x):
+        """ Codes of a Batch
+        """
+        return np.dot(x - self.mean_, self.components_.T)
+
+    def inverse_transform(self, codes):
+        """ Reconstructions from Codes
+        """
+        return np.dot(codes, self.components_) + self.mean_
+
+
+class StreamedLDA():
+    """Linear Discriminant Analysis from Streamed Sufficient Statistics
+
+    One pass accumulates the count, sum and sum of outer products of the
+    images and the sum of each class, from which the between and within
+    class scatter follow. Memory is the (d, d) scatter, independent of the
+    number of images. The within class scatter is shrunk towards a multiple
+    of the identity, since constant border pixels make it singular.
+
+    Attributes:
+        n_components: number of discriminant directions
+        shrinkage: fraction of the mean variance added to the diagonal
+        mean_: (d,) mean image
+        scalings_: (d, n_components) discriminant directions
+    """
+
+    def __init__(self, n_components=2, shrinkage=1e-3):
+        """ Init StreamedLDA
+        """
+        self.n_components = n_components
+        self.shrinkage = shrinkage
+
+    def fit(self, batches):
+        """ Fit in one Pass
+
+        Args:
+            batches: iterable of (B, d) images and (B,) labels
+
+        Returns:
+            self
+        """
+        count, total, outer = 0, 0., 0.
+        class_counts, class_sums = {}, {}
+
+        for x, y in batches:
+            x = np.asarray(x, dtype=float)
+            count += len(x)
+            total = total + np.sum(x, axis=0)
+            outer = outer + np.dot(x.T, x)
+
+            for label in np.unique(y):
+                rows = x[y == label]
+                class_counts[label] = class_counts.get(label, 0) + len(rows)
+                class_sums[label] = class_sums.get(label, 0.) + \
+                    np.sum(rows, axis=0)
+
+        self.mean_ = total / count
+        scatter = outer - count * np.outer(self.mean_, self.mean_)
+
+        between = 0.
+        for label, size in class_counts.items():
+            offset = class_sums[label] / size - self.mean_
+            between = between + size * np.outer(offset, offset)
+
+        within = scatter - between
+        within += self.shrinkage * np.trace(within) / len(within) * \
+            np.eye(len(within))
+
+        values, vectors = eigh(between, within)
+        self.scalings_ = vectors[:, ::-1][:, :self.n_components]
+
+        return self
+
+    def transform(self, x):
+        """ Discriminant Coordinates of a Batch
+        """
+        return np.dot(x - self.mean_, self.scalings_)
+
+
+class Baseline():
+    """Out-of-Core Linear Baselines for the Classical Autoencoders
+
+    Fits incremental PCA, randomized PCA and LDA from batches streamed off a
+    Dataset cache instead of the full in-memory arrays, and measures the
+    reconstruction error of the PCA projections next to the autoencoders on
+    the test split. Every fit and evaluation records its runtime and its own
+    peak resident memory, so the linear projection and the learned encoder
+    can be compared at production data sizes.
+
+    Attributes:
+        dataset: Dataset streaming the images
+        n_components: size of the code of every baseline
+        batch_size: images per streamed batch
+    """
+
+    def __init__(self, dataset, n_components=2, batch_size=1000):
+        """ Init Baseline
+        """
+        self.dataset = dataset
+        self.n_components = n_components
+        self.batch_size = batch_size
+
+    def images(self, split='train', shape=None):
+        """ Flat Image Batches of a Split in Order
+
+        Returns:
+            callable returning a fresh iterator, one pass per call
+        """
+        def batches():
+            for x, y in self.dataset.labelled(split, self.batch_size, shape):
+                yield x.reshape(len(x), -1) if shape is None else x
+
+        return batches
+
+    def incremental_pca(self, split='train'):
+        """ sklearn IncrementalPCA Fitted Batch by Batch
+        """
+        from sklearn.decomposition import IncrementalPCA
+
+        pca = IncrementalPCA(n_components=self.n_components)
+        for x in self.images(split)():
+            if len(x) >= self.n_components:
+                pca.partial_fit(x)
+
+        return pca
+
+    def randomized_pca(self, split='train', **kwargs):
+        """ RandomizedPCA Fitted over Streamed Passes
+        """
+        return RandomizedPCA(self.n_components, **kwargs).fit(
+            self.images(split))
+
+    def lda(self, split='train'):
+        """ StreamedLDA Fitted in one Pass
+        """
+        batches = ((x.reshape(len(x), -1), y) for x, y in
+                   self.dataset.labelled(split, self.batch_size))
+
+        return StreamedLDA(self.n_components).fit(batches)
+
+    def reconstruction_error(self, reconstruct, split='test', shape=None):
+        """ Mean Squared Error per Pixel of a Reconstruction
+
+        Args:
+            reconstruct: callable mapping a batch to its reconstruction, e.g.
+                a keras Model.predict_on_batch
+            split: split evaluated
+            shape: optional shape of one image fed to reconstruct, the flat
+                image by default
+
+        Returns:
+            float
+        """
+        squared, count = 0., 0
+        for x in self.images(split, shape)():
+            output = np.reshape(reconstruct(x), x.shape)
+            squared += np.sum((output - x) ** 2, dtype=float)
+            count += x.size
+
+        return squared / count
+
+    @staticmethod
+    def measure(func):
+        """ Run and Measure a Callable
+
+        Untraced, so the timing is that of the plain streaming loops, and
+        with the peak resident memory restarted beforehand, so it covers the
+        native arrays of numpy and Keras and only this call.
+
+        Returns:
+            its result and a dictionary of seconds and peak resident memory
+            in bytes, None where the peak cannot be restarted and would
+            carry over from earlier calls
+        """
+        restarted = reset_peak_memory()
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+
+        return result, {'seconds': seconds,
+                        'peak_memory': peak_memory() if restarted else None}
+
+    def compare(self, autoencoders=None, split='test'):
+        """ Fit the Baselines and Measure them with the Autoencoders
+
+        Args:
+            autoencoders: optional dictionary of name to a dictionary with
+                'reconstruct', and optionally 'fit', a callable training it,
+                and 'shape', the shape of one image it takes
+            split: split the reconstruction error is measured on
+
+        Returns:
+            list of dictionaries with the name, 'fit' and 'evaluate'
+            measurements and the reconstruction error, None for LDA
+        """
+        results = []
+
+        for name, fit in (('incremental_pca', self.incremental_pca),
+                          ('randomized_pca', self.randomized_pca)):
+            model, fitted = self.measure(fit)
+            error, evaluated = self.measure(lambda: self.reconstruction_error(
+                lambda x: model.inverse_transform(model.transform(x)), split))
+            results.append({'name': name, 'fit': fitted,
+                            'evaluate': evaluated, 'error': error})
+
+        fitted = self.measure(self.lda)[1]
+        results.append({'name': 'lda', 'fit': fitted, 'evaluate': None,
+                        'error': None})
+
+        for name, model in sorted((autoencoders or {}).items()):
+            fitted = None
+            if model.get('fit') is not None:
+                fitted = self.measure(model['fit'])[1]
+
+            error, evaluated = self.measure(lambda: self.reconstruction_error(
+                model['reconstruct'], split, model.get('shape')))
+            results.append({'name': name, 'fit': fitted,
+                            'evaluate': evaluated, 'error': error})
+
+        return results
@@ -0,0 +1,333 @@
+import json
+import os
+import pickle
+import zipfile
+
+import numpy as np
+from numpy.lib.format import (open_memmap, read_array, read_array_header_1_0,
+                              read_array_header_2_0, read_magic)
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'data_cache')
+
+SPLITS = ('train', 'test')
+
+# downloads shared with keras.datasets, under the same file names
+MNIST_ORIGIN = ('https://storage.googleapis.com/tensorflow/tf-keras-datasets/'
+                'mnist.npz')
+CIFAR10_ORIGIN = 'https://www.cs.toronto.edu/~kriz/cifar-10-python.tar.gz'
+
+CIFAR10_FILES = {'train': ['data_batch_%d' % i for i in range(1, 6)],
+                 'test': ['test_batch']}
+
+# images in each CIFAR-10 pickle
+CIFAR10_BATCH = 10000
+
+
+def mnist_splits(chunk_size):
+    """ Splits of the MNIST Archive, Read Chunk by Chunk
+
+    The images are read straight off the .npy members of mnist.npz, so
+    only one chunk is decoded at a time. The labels are read whole.
+
+    Yields:
+        split, number of images, shape of one image and a generator of
+        (images, labels) chunks, consumed before the next split
+    """
+    from keras.utils.data_utils import get_file
+
+    path = get_file('mnist.npz', origin=MNIST_ORIGIN)
+
+    with zipfile.ZipFile(path) as archive:
+        for split in SPLITS:
+            with archive.open('y_%s.npy' % split) as member:
+                labels = read_array(member)
+
+            with archive.open('x_%s.npy' % split) as member:
+                version = read_magic(member)
+                read_header = read_array_header_1_0 if version == (1, 0) \
+                    else read_array_header_2_0
+                shape, fortran_order, dtype = read_header(member)
+                if fortran_order:
+                    raise Exception('MNIST images must be in C order')
+
+                yield (split, shape[0], shape[1:],
+                       npy_chunks(member, shape, dtype, labels, chunk_size))
+
+
+def npy_chunks(member, shape, dtype, labels, chunk_size):
+    """ Chunks of the Rows of an Open .npy File past its Header
+
+    Returns:
+        generator of (images, labels) chunks
+    """
+    row_bytes = int(np.prod(shape[1:])) * dtype.itemsize
+
+    for start in range(0, shape[0], chunk_size):
+        count = min(chunk_size, shape[0] - start)
+        images = np.frombuffer(member.read(count * row_bytes), dtype=dtype)
+        yield (images.reshape((count,) + tuple(shape[1:])),
+               labels[start:start + count])
+
+
+def cifar10_splits(chunk_size):
+    """ Splits of the CIFAR-10 Batches, Read one Pickle at a Time
+
+    Every pickle holds CIFAR10_BATCH images, which is the chunk whatever
+    chunk_size. Images are channels last, as keras.datasets returns them.
+
+    Yields:
+        as mnist_splits
+    """
+    from keras.utils.data_utils import get_file
+
+    path = get_file('cifar-10-batches-py', origin=CIFAR10_ORIGIN, untar=True)
+
+    def chunks(names):
+        for name in names:
+            with open(os.path.join(path, name), 'rb') as handle:
+                batch = pickle.load(handle, encoding='bytes')
+            images = batch[b'data'].reshape(-1, 3, 32, 32)
+            yield images.transpose(0, 2, 3, 1), np.array(batch[b'labels'])
+
+    for split in SPLITS:
+        yield (split, CIFAR10_BATCH * len(CIFAR10_FILES[split]), (32, 32, 3),
+               chunks(CIFAR10_FILES[split]))
+
+
+# reader of the splits of each dataset and the value of a white pixel
+SOURCES = {'mnist': (mnist_splits, 255.),
+           'cifar10': (cifar10_splits, 255.)}
+
+
+class Dataset():
+    """Memory-Mapped Image Dataset with a Streaming Input Pipeline
+
+    The first use streams the downloaded keras dataset once, chunk by chunk,
+    into .npy files under cache_dir, either as raw uint8 pixels, scaled to
+    [0, 1] as each batch is read, or as float32 already scaled. Later runs
+    memory map those files, so nothing is decoded or normalised again and
+    only the batches in flight are held in memory. The generators yield
+    (input, target) batches for Model.fit_generator, with optional Gaussian
+    noise on the inputs for the denoising autoencoders.
+
+    Attributes:
+        name: 'mnist' or 'cifar10'
+        cache_dir: directory of the cached datasets
+        dtype: 'uint8' or 'float32', type of the cached pixels
+    """
+
+    def __init__(self, name, cache_dir=CACHE_DIR, dtype='uint8'):
+        """ Init Dataset
+
+        Args:
+            name: 'mnist' or 'cifar10'
+            cache_dir: directory of the cached datasets
+            dtype: 'uint8' or 'float32'
+
+        Raises:
+            Exception: An error if the dataset or dtype is unknown
+        """
+        if name not in SOURCES:
+            raise Exception('Dataset must be one of %s' % ', '.join(SOURCES))
+        if dtype not in ('uint8', 'float32'):
+            raise Exception('Cache dtype must be uint8 or float32')
+
+        self.name = name
+        self.cache_dir = cache_dir
+        self.dtype = dtype
+
+    @property
+    def path(self):
+        """ Directory of this Dataset's Cache
+        """
+        return os.path.join(self.cache_dir, '%s_%s' % (self.name, self.dtype))
+
+    def prepare(self, chunk_size=10000):
+        """ Stream the keras Dataset into the Cache unless already there
+
+        Args:
+            chunk_size: images decoded at a time
+
+        Returns:
+            dictionary of the cache metadata
+        """
+        meta_path = os.path.join(self.path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as handle:
+                return json.load(handle)
+
+        read, white = SOURCES[self.name]
+        sizes = {}
+        for split, size, shape, chunks in read(chunk_size):
+            self.write(split, chunks, size, shape, white)
+            sizes[split] = size
+
+        # written last, so an interrupted prepare starts over
+        meta = {'shape': [int(length) for length in shape], 'sizes': sizes}
+        with open(meta_path, 'w') as handle:
+            json.dump(meta, handle)
+
+        return meta
+
+    def write(self, split, chunks, size, shape, white):
+        """ Write a Split to the Cache one Chunk at a Time
+
+        Args:
+            split: 'train' or 'test'
+            chunks: iterable of (images, labels) array pairs
+            size: total number of images
+            shape: shape of one image
+            white: value of a white pixel in the chunks
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        images_out = open_memmap(os.path.join(self.path, 'x_%s.npy' % split),
+                                 mode='w+', dtype=self.dtype,
+                                 shape=(size,) + tuple(shape))
+        labels_out = open_memmap(os.path.join(self.path, 'y_%s.npy' % split),
+                                 mode='w+', dtype='int64', shape=(size,))
+
+        start = 0
+        for images, labels in chunks:
+            stop = start + len(images)
+            if self.dtype == 'float32':
+                images = np.asarray(images, dtype='float32') / white
+            images_out[start:stop] = images
+            labels_out[start:stop] = np.ravel(labels)
+            start = stop
+
+        images_out.flush()
+        labels_out.flush()
+
+    def arrays(self, split):
+        """ Memory Maps of a Split
+
+        Args:
+            split: 'train' or 'test'
+
+        Returns:
+            (N, ...) images in the cache dtype and (N,) labels, read lazily
+        """
+        if split not in SPLITS:
+            raise Exception('Split must be train or test')
+
+        self.prepare()
+
+        return (np.load(os.path.join(self.path, 'x_%s.npy' % split),
+                        mmap_mode='r'),
+                np.load(os.path.join(self.path, 'y_%s.npy' % split),
+                        mmap_mode='r'))
+
+    def scale(self, images, shape=None):
+        """ Float32 Images in [0, 1]
+
+        Args:
+            images: batch read from the cache
+            shape: optional shape of one image, e.g. (784,) for the dense
+                models or (28, 28, 1) for the convolutional ones
+        """
+        images = np.asarray(images, dtype='float32')
+        if self.dtype == 'uint8':
+            images /= SOURCES[self.name][1]
+
+        if shape is not None:
+            images = images.reshape((len(images),) + tuple(shape))
+
+        return images
+
+    def load(self, split, shape=None):
+        """ Whole Split in Memory, as the Notebook used to Load it
+
+        Returns:
+            scaled (N, ...) images and (N,) labels
+        """
+        images, labels = self.arrays(split)
+
+        return self.scale(images, shape), np.array(labels)
+
+    def steps(self, split, batch_size=128):
+        """ Number of Batches in one Pass over a Split
+        """
+        return -(-self.prepare()['sizes'][split] // batch_size)
+
+    def batches(self, split='train', batch_size=128, shape=None,
+                noise_factor=None, shuffle=True, rng=None):
+        """ One Pass over a Split
+
+        Shuffling permutes the order of contiguous batches and the images
+        within each batch, so reads from the memory map stay sequential. It
+        is not a full per-image shuffle: an image always shares its batch
+        with the same neighbours of the cache, only their order and the
+        position of the batch in the pass change.
+
+        Args:
+            split: 'train' or 'test'
+            batch_size: images per batch
+            shape: optional shape of one image
+            noise_factor: optional standard deviation of Gaussian noise added
+                to the inputs, clipped to [0, 1]
+            shuffle: whether to shuffle the batches and the images within
+                each batch
+            rng: numpy RandomState of the shuffle and the noise
+
+        Returns:
+            generator of (inputs, targets) float32 batches
+        """
+        rng = np.random if rng is None else rng
+        images = self.arrays(split)[0]
+
+        starts = np.arange(0, len(images), batch_size)
+        if shuffle:
+            starts = rng.permutation(starts)
+
+        for start in starts:
+            targets = self.scale(images[start:start + batch_size], shape)
+            if shuffle:
+                targets = targets[rng.permutation(len(targets))]
+
+            inputs = targets
+            if noise_factor is not None:
+                inputs = np.clip(targets + noise_factor * rng.normal(
+                    size=targets.shape).astype('float32'), 0., 1.)
+
+            yield inputs, targets
+
+    def labelled(self, split='train', batch_size=1000, shape=None):
+        """ One Pass over a Split in Order, with the Labels
+
+        Returns:
+            generator of (images, labels) batches
+        """
+        images, labels = self.arrays(split)
+
+        for start in range(0, len(images), batch_size):
+            yield (self.scale(images[start:start + batch_size], shape),
+                   np.array(labels[start:start + batch_size]))
+
+    def generator(self, split='train', batch_size=128, shape=None,
+                  noise_factor=None, shuffle=True, seed=None,
+                  fixed_noise=False):
+        """ Endless Batches for Model.fit_generator
+
+        Use with steps_per_epoch=steps(split, batch_size).
+
+        Args:
+            as for batches, with seed seeding the shuffle and the noise
+            fixed_noise: whether every pass repeats the shuffle and noise of
+                the first, so validation losses of different epochs compare
+                on the same noisy inputs
+        """
+        if fixed_noise and seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        rng = np.random.RandomState(seed)
+
+        while True:
+            for batch in self.batches(split, batch_size, shape, noise_factor,
+                                      shuffle, rng):
+                yield batch
+
+            if fixed_noise:
+                rng = np.random.RandomState(seed)
@@ -0,0 +1,120 @@
+import json
+import time
+import warnings
+
+import numpy as np
+from keras.callbacks import Callback
+
+from memory import peak_memory, reset_peak_memory
+
+
+class ProfilingCallback(Callback):
+    """Throughput and Latency of Keras Training, per Epoch
+
+    Times every batch from on_batch_begin to on_batch_end as compute, and
+    the gap since the previous batch ended as data loading, which covers
+    the input generator and the Keras overhead around it. The time from the
+    last batch to the end of the epoch is reported apart as validation, and
+    the samples per second only count training. At the end of each epoch it
+    logs the throughput, batch latency percentiles, the loading and compute
+    split, the peak resident memory and the epoch logs as one JSON line,
+    tagged to compare batch sizes and architectures.
+
+    Attributes:
+        path: optional JSON lines file receiving each epoch
+        tag: dictionary of fields added to every record, e.g. the model
+            name and batch size
+        percentiles: batch latency percentiles reported
+        batch_size: optional samples per batch, for Keras versions whose
+            batch logs have no 'size', e.g. with fit_generator
+        records: list of the epoch records
+    """
+
+    def __init__(self, path=None, tag=None, percentiles=(50, 90, 99),
+                 batch_size=None):
+        """ Init ProfilingCallback
+        """
+        super(ProfilingCallback, self).__init__()
+        self.path = path
+        self.tag = dict(tag or {})
+        self.percentiles = percentiles
+        self.batch_size = batch_size
+        self.records = []
+        self.warned = False
+
+    def batch_samples(self, logs):
+        """ Samples in a Batch
+
+        Keras reports them as 'size' in the batch logs. Otherwise the
+        batch_size of this callback or of fit is used, which overcounts a
+        smaller last batch, and without either the samples are unknown.
+
+        Returns:
+            int, or None when unknown
+        """
+        size = (logs or {}).get('size')
+        if size is None:
+            size = self.batch_size
+        if size is None:
+            size = (getattr(self, 'params', None) or {}).get('batch_size')
+
+        if size is None and not self.warned:
+            warnings.warn('ProfilingCallback cannot tell the batch size, '
+                          'pass batch_size to report samples per second')
+            self.warned = True
+
+        return None if size is None else int(size)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        reset_peak_memory()
+        self.latencies = []
+        self.load_seconds = 0.
+        self.samples = 0
+        self.epoch_start = self.batch_end = time.perf_counter()
+
+    def on_batch_begin(self, batch, logs=None):
+        self.batch_start = time.perf_counter()
+        self.load_seconds += self.batch_start - self.batch_end
+
+    def on_batch_end(self, batch, logs=None):
+        self.batch_end = time.perf_counter()
+        self.latencies.append(self.batch_end - self.batch_start)
+
+        size = self.batch_samples(logs)
+        if size is None or self.samples is None:
+            self.samples = None
+        else:
+            self.samples += size
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_end = time.perf_counter()
+        train_seconds = self.batch_end - self.epoch_start
+        latencies = np.array(self.latencies or [np.nan])
+
+        samples_per_sec = None
+        if self.samples is not None and train_seconds > 0:
+            samples_per_sec = self.samples / train_seconds
+
+        record = dict(self.tag, epoch=epoch, samples=self.samples,
+                      batches=len(self.latencies),
+                      seconds=epoch_end - self.epoch_start,
+                      train_seconds=train_seconds,
+                      validation_seconds=epoch_end - self.batch_end,
+                      samples_per_sec=samples_per_sec,
+                      load_seconds=self.load_seconds,
+                      compute_seconds=float(np.sum(self.latencies)),
+                      peak_memory=peak_memory())
+        for percentile in self.percentiles:
+            record['latency_p%d' % percentile] = float(
+                np.percentile(latencies, percentile))
+
+        # training and validation metrics, validation is neither loading
+        # nor compute of a training batch but counts in validation_seconds
+        record.update((name, float(value))
+                      for name, value in (logs or {}).items())
+
+        self.records.append(record)
+
+        if self.path is not None:
+            with open(self.path, 'a') as trace:
+                trace.write(json.dumps(record) + '\n')
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from sklearn.decomposition import PCA
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+
+from baseline import RandomizedPCA, StreamedLDA
+
+
+def streamed(images, batch_size=700):
+    """ Callable returning a fresh pass over the batches of images
+    """
+    return lambda: (images[start:start + batch_size]
+                    for start in range(0, len(images), batch_size))
+
+
+def rotated(scales, count=5000, seed=1):
+    """ (count, d) images with the given standard deviations along random
+    orthogonal axes, offset from the origin
+    """
+    rng = np.random.RandomState(seed)
+    axes = np.linalg.qr(rng.normal(size=(len(scales), len(scales))))[0]
+
+    return np.dot(rng.normal(size=(count, len(scales))) * scales, axes) + 3
+
+
+def reconstruction_error(model, images):
+    return np.mean((model.inverse_transform(model.transform(images)) -
+                    images) ** 2)
+
+
+def test_randomized_pca_matches_pca_with_spectral_gap():
+    images = rotated(np.r_[[9, 7, 5, 4], np.linspace(1, 0.1, 56)])
+    randomized = RandomizedPCA(4).fit(streamed(images))
+    exact = PCA(4).fit(images)
+
+    np.testing.assert_allclose(randomized.mean_, exact.mean_, atol=1e-12)
+    np.testing.assert_allclose(
+        np.abs(np.sum(randomized.components_ * exact.components_, axis=1)),
+        1, atol=1e-6)
+
+
+def test_randomized_pca_error_on_near_degenerate_spectrum():
+    images = rotated(np.linspace(5, 0.1, 60))
+    randomized = RandomizedPCA(4).fit(streamed(images))
+    exact = PCA(4).fit(images)
+
+    # components of nearly equal variance are not unique, their error is
+    assert reconstruction_error(randomized, images) == pytest.approx(
+        reconstruction_error(exact, images), rel=1e-2)
+
+
+def test_streamed_lda_spans_lda_subspace():
+    rng = np.random.RandomState(2)
+    labels = rng.randint(0, 4, 3000)
+    centers = rng.normal(scale=3, size=(4, 20))
+    images = centers[labels] + rng.normal(size=(3000, 20)) * \
+        np.linspace(2, 0.5, 20)
+
+    batches = [(images[start:start + 500], labels[start:start + 500])
+               for start in range(0, len(images), 500)]
+    streamed_lda = StreamedLDA(3, shrinkage=0).fit(batches)
+    exact = LinearDiscriminantAnalysis(solver='eigen').fit(images, labels)
+
+    # canonical correlations of the two projections
+    codes = [np.linalg.qr(codes - codes.mean(axis=0))[0] for codes in
+             (streamed_lda.transform(images),
+              np.dot(images, exact.scalings_[:, :3]))]
+    correlations = np.linalg.svd(np.dot(codes[0].T, codes[1]),
+                                 compute_uv=False)
+
+    np.testing.assert_allclose(correlations, 1, atol=1e-8)
@@ -0,0 +1,126 @@
+import os
+import pickle
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import dataset
+from dataset import Dataset
+
+
+SIZES = {'train': 300, 'test': 70}
+
+
+@pytest.fixture
+def source(tmpdir, monkeypatch):
+    """ Directory standing in for the keras download cache
+    """
+    path = str(tmpdir.mkdir('downloads'))
+    data_utils = types.ModuleType('keras.utils.data_utils')
+    data_utils.get_file = lambda name, origin, untar=False: \
+        os.path.join(path, name)
+
+    for name in ('keras', 'keras.utils'):
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    monkeypatch.setitem(sys.modules, 'keras.utils.data_utils', data_utils)
+
+    return path
+
+
+def fake_mnist(path):
+    """ mnist.npz of (N, 6, 5) uint8 images with their index in the first
+    two pixels
+
+    Returns:
+        dictionary of the (images, labels) of each split
+    """
+    rng = np.random.RandomState(0)
+    arrays, splits = {}, {}
+    for split, size in SIZES.items():
+        images = rng.randint(0, 256, (size, 6, 5)).astype('uint8')
+        images[:, 0, 0], images[:, 0, 1] = np.divmod(np.arange(size), 256)
+        labels = rng.randint(0, 10, size).astype('uint8')
+        arrays.update({'x_' + split: images, 'y_' + split: labels})
+        splits[split] = images, labels
+
+    np.savez_compressed(os.path.join(path, 'mnist.npz'), **arrays)
+
+    return splits
+
+
+def indices(targets):
+    """ Image indices encoded in the first two pixels of scaled batches
+    """
+    pixels = np.round(targets.reshape(len(targets), -1)[:, :2] * 255)
+
+    return (256 * pixels[:, 0] + pixels[:, 1]).astype(int)
+
+
+@pytest.mark.parametrize('dtype', ['uint8', 'float32'])
+def test_mnist_cache_round_trips(tmpdir, source, dtype):
+    splits = fake_mnist(source)
+    data = Dataset('mnist', str(tmpdir.join('cache')), dtype)
+
+    assert data.prepare(chunk_size=64) == {
+        'shape': [6, 5], 'sizes': SIZES}
+    for split, (images, labels) in splits.items():
+        cached_images, cached_labels = data.arrays(split)
+        scale = 1. if dtype == 'uint8' else 255.
+
+        np.testing.assert_allclose(cached_images, images / scale, rtol=1e-6)
+        np.testing.assert_array_equal(cached_labels, labels)
+
+
+def test_cifar10_cache_is_channels_last(tmpdir, source, monkeypatch):
+    monkeypatch.setattr(dataset, 'CIFAR10_BATCH', 4)
+    folder = os.path.join(source, 'cifar-10-batches-py')
+    os.mkdir(folder)
+
+    rng = np.random.RandomState(0)
+    batches = {}
+    for split, names in dataset.CIFAR10_FILES.items():
+        for name in names:
+            batches[name] = {b'data': rng.randint(0, 256, (4, 3072)).astype(
+                'uint8'), b'labels': list(rng.randint(0, 10, 4))}
+            with open(os.path.join(folder, name), 'wb') as handle:
+                pickle.dump(batches[name], handle)
+
+    images, labels = Dataset('cifar10', str(tmpdir.join('cache'))).arrays(
+        'train')
+    first = batches['data_batch_2']
+
+    assert images.shape == (20, 32, 32, 3)
+    # red, green and blue planes of the first pixel of the fifth image
+    np.testing.assert_array_equal(images[4, 0, 0],
+                                  first[b'data'][0, [0, 1024, 2048]])
+    np.testing.assert_array_equal(labels[4:8], first[b'labels'])
+
+
+def test_shuffled_passes_cover_every_image_once(tmpdir, source):
+    fake_mnist(source)
+    data = Dataset('mnist', str(tmpdir.join('cache')))
+    generator = data.generator('train', 64, seed=0)
+
+    passes = [np.concatenate([indices(next(generator)[1])
+                              for _ in range(data.steps('train', 64))])
+              for _ in range(2)]
+
+    for order in passes:
+        np.testing.assert_array_equal(np.sort(order), np.arange(300))
+    assert not np.array_equal(passes[0], passes[1])
+
+
+@pytest.mark.parametrize('fixed_noise', [True, False])
+def test_fixed_noise_repeats_every_pass(tmpdir, source, fixed_noise):
+    fake_mnist(source)
+    data = Dataset('mnist', str(tmpdir.join('cache')))
+    generator = data.generator('test', 32, noise_factor=0.5, shuffle=False,
+                               fixed_noise=fixed_noise)
+
+    passes = [np.concatenate([next(generator)[0]
+                              for _ in range(data.steps('test', 32))])
+              for _ in range(2)]
+
+    assert np.array_equal(passes[0], passes[1]) == fixed_noise
@@ -1,9 +1,16 @@
+import os
+import random
 from random import uniform
-from scipy.optimize import basinhopping
 import numpy as np
 
+from checkpoint import Checkpoint
 from circuit import Circuit
 from hydrogen import Hydrogen
+from instrument import Instrument
+
+
+# number of classical degrees of freedom for each model
+N_PARAMS = {'a': 15, 'b': 3}
 
 
 class Autoencoder():
@@ -17,20 +24,69 @@ class Autoencoder():
     directly employed. The parameters of the quantum autoencoder are trained
     using a the Basin-Hopping algorithm and simulated on a quantum computer
 
+    qutip, scipy.optimize and the Hydrogen dataset are only loaded once they
+    are used, so constructing an Autoencoder from given training states and
+    running the statevector paths stays cheap, e.g. in worker processes.
+
     Attributes:
-        init_state:
+        init_state: first training state as a Qobj, built on first use
+        train_states: (B, 16) array of the training ground states, prepared
+            from Hydrogen on first use when none were given
+        instrument: Instrument receiving stage timings, evaluation and hop
+            counters and an event per hop and per iteration
         circuit_a:
         circuit_b:
     """
 
-    def __init__(self):
+    def __init__(self, train_states=None, instrument=None,
+                 precision='double', num_ref=2):
         """Initialize Autoencoder with moelecular hydrogen ground states
+
+        Args:
+            train_states: optional (B, 16) array of training states, skips
+                preparing the Hydrogen dataset when given
+            instrument: optional Instrument, e.g. with a trace file or
+                per-iteration callbacks
+            precision: 'double' or 'single' simulation of both circuits
+            num_ref: number of reference (and trash) qubits
         """
-        self.init_state = Hydrogen().get_state()
+        self.instrument = Instrument() if instrument is None else instrument
+
+        self._train_states = None
+        if train_states is not None:
+            self._train_states = np.asarray(train_states)
+        self._init_state = None
 
-        # unitcells' a and b
-        self.circuit_a = Circuit(2, self.init_state)
-        self.circuit_b = Circuit(2, self.init_state)
+        # unitcells' a and b, their input state is set by init_state
+        self.circuit_a = Circuit(num_ref, None, method='analytic',
+                                 instrument=self.instrument,
+                                 precision=precision)
+        self.circuit_b = Circuit(num_ref, None, method='analytic',
+                                 instrument=self.instrument,
+                                 precision=precision)
+
+    @property
+    def train_states(self):
+        """ Training States, from the Hydrogen Dataset unless Given
+        """
+        if self._train_states is None:
+            self._train_states = Hydrogen().train_states
+
+        return self._train_states
+
+    @property
+    def init_state(self):
+        """ First Training State as a Qobj, also the Input of both Circuits
+        """
+        if self._init_state is None:
+            from qutip import Qobj as Q
+
+            self._init_state = Q(self.train_states[0].reshape(-1, 1),
+                                 dims=[[2] * 4, [1] * 4])
+            self.circuit_a.input_state = self._init_state
+            self.circuit_b.input_state = self._init_state
+
+        return self._init_state
 
     @staticmethod
     def get_bounds(n_params):
@@ -51,53 +107,294 @@ class Autoencoder():
         return [uniform(0, 4 * np.pi) for i in range(n_params)]
 
     @staticmethod
-    def cost_func(params, fidelity):
+    def cost_func(params, circuit, model, states):
         """ Cost Function
         Args:
             params: An list of the degree of freedom for qubit gate operations
-            fidelity:
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
+            states: (B, 16) array of training states
+        """
+        return 1 - circuit.batch_fidelity(model, params, states)
+
+    @staticmethod
+    def cost_grad(params, circuit, model, states):
+        """ Cost Function and its Exact Gradient
+        Args:
+            params: An list of the degree of freedom for qubit gate operations
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
+            states: (B, 16) array of training states
+        """
+        fidelity, gradient = circuit.fidelity_gradient(model, params, states)
+
+        return 1 - fidelity, -gradient
+
+    @staticmethod
+    def sampled_cost(params, circuit, model, states, shots, rng):
+        """ Cost Function Estimated from Swap Test Shots
+        Args:
+            params: An list of the degree of freedom for qubit gate operations
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
+            states: (B, 16) array of training states
+            shots: number of swap test shots per training state
+            rng: numpy RandomState drawing the shots
         """
-        return np.sum([(fidelity * param) for param in params])
+        return 1 - circuit.batch_fidelities(model, params, states, shots, rng)
 
-    def optimize(self, fidelity, init, bounds, n_iter=500, step_size=(10 ** (-8))):
+    def get_circuit(self, model):
+        """ Circuit of a Model
+
+        Args:
+            model: A string indicating which model to use
+        """
+        if model == 'a':
+            return self.circuit_a
+        elif model == 'b':
+            return self.circuit_b
+        else:
+            raise Exception('invalid entry')
+
+    def optimize(self, circuit, model, init, bounds, n_iter=500,
+                 step_size=(10 ** (-8)), callback=None, seed=None,
+                 checkpoint=None, iteration=0, states=None, shots=None,
+                 optimizer=None, init_cost=np.inf):
         """Perform Optimization using Basin-Hopping and L-BFGS-B minimizer
 
+        With shots the cost is estimated from swap test measurements, which
+        has no usable gradient, so the local minimizer is Powell instead.
+        An optimizer backend such as optimizers.SPSA or optimizers.Adam
+        replaces basin-hopping, each of its n_iter steps being reported as a
+        hop.
+
         Args:
-            fidelity: An integer 
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
             init: An list of initial parameters for gate operations
             bounds: A set of tuples representing the upper and lower bounds
                 for each parameter
             n_iter: An integer number of iterations
             step_size: An integer width for size of each step
+            callback: optional callback(x, cost, accept) run after each hop,
+                returning True stops the basin-hopping
+            seed: optional seed, or numpy RandomState, for the random hops
+            checkpoint: optional Checkpoint written every checkpoint.every
+                hops and when the run ends
+            iteration: iterations already done by the run this continues
+            states: training states, self.train_states by default
+            shots: optional number of swap test shots per training state
+                and cost evaluation, drawn from the hop random generator
+            optimizer: optional optimizers.Optimizer backend, a restored
+                one continues its checkpointed run
+            init_cost: cost of init when it is the best point of the run
+                this continues, so checkpoints never fall back to a worse one
+        """
+        instrument = self.instrument
+        states = self.train_states if states is None else states
+
+        if isinstance(seed, np.random.RandomState):
+            rng = seed
+        else:
+            rng = np.random.RandomState(seed)
+
+        # hops seen and the best minimum so far, basin-hopping reports its
+        # initial minimization as a hop but backends only report steps
+        progress = {'hops': 0, 'params': np.array(init, dtype=float),
+                    'cost': init_cost}
+        first = 1 if optimizer is None else 0
+
+        def snapshot(done):
+            checkpoint.save({
+                'model': model, 'params': progress['params'],
+                'fidelity': 1 - progress['cost'],
+                'iteration': iteration + max(progress['hops'] - first, 0),
+                'n_iter': iteration + n_iter, 'step_size': step_size,
+                'states': states, 'rng': rng.get_state(),
+                'random': random.getstate(), 'shots': shots,
+                'optimizer': optimizer, 'done': done})
+
+        def objective(params, *args):
+            instrument.count('cost_evals')
+            if shots is not None:
+                return self.sampled_cost(params, *args)
+
+            instrument.count('grad_evals')
+            return self.cost_grad(params, *args)
+
+        # the initial minimization is reported as the first hop
+        def hop(params, cost, accept):
+            instrument.lap('optimizer_step')
+            instrument.count('hops')
+            if accept:
+                instrument.count('accepted_hops')
+            instrument.emit('hop', model=model, cost=cost,
+                            accepted=bool(accept))
+
+            progress['hops'] += 1
+            if cost < progress['cost']:
+                progress['params'], progress['cost'] = np.copy(params), cost
+
+            if checkpoint is not None and \
+                    progress['hops'] % checkpoint.every == 0:
+                snapshot(done=False)
+
+            if callback is not None:
+                return callback(params, cost, accept)
+
+        # using L-BDGS-B minimizer method with the analytic gradient, the
+        # circuit, model and training states are static arguments
+        minimizer = {"method": "L-BFGS-B", "jac": True,
+                     "args": (circuit, model, states),
+                     "bounds": bounds}
+
+        if shots is not None:
+            minimizer = {"method": "Powell",
+                         "args": (circuit, model, states, shots, rng),
+                         "bounds": bounds}
+
+        instrument.start_lap('optimizer_step')
+
+        if optimizer is not None:
+            res = optimizer.minimize(circuit, model, init, bounds, states,
+                                     n_iter=n_iter, callback=hop, rng=rng,
+                                     shots=shots, start=iteration)
+        else:
+            from scipy.optimize import basinhopping
+
+            res = basinhopping(objective,
+                               init,
+                               niter=n_iter,
+                               stepsize=step_size,
+                               minimizer_kwargs=minimizer,
+                               callback=hop,
+                               seed=rng)
+
+        if checkpoint is not None:
+            snapshot(done=True)
+
+        return res
+
+    def resume(self, checkpoint, callback=None):
+        """Continue a Checkpointed Run
+
+        Restores the random generators and restarts basin-hopping from the
+        best parameters saved, for the iterations that were left. An
+        optimizer backend is restored with its run state instead, so it
+        takes exactly the steps the uninterrupted run would have.
+
+        Args:
+            checkpoint: Checkpoint of the interrupted run
+            callback: optional callback(x, cost, accept) run after each hop
+
+        Returns:
+            the basin-hopping result of the remaining iterations
+        """
+        state = checkpoint.load()
+        if state is None:
+            raise Exception('No checkpoint at %s' % checkpoint.path)
+
+        random.setstate(state['random'])
+        rng = np.random.RandomState()
+        rng.set_state(state['rng'])
+
+        model = state['model']
+
+        return self.optimize(self.get_circuit(model), model, state['params'],
+                             self.get_bounds(N_PARAMS[model]),
+                             n_iter=state['n_iter'] - state['iteration'],
+                             step_size=state['step_size'], callback=callback,
+                             seed=rng, checkpoint=checkpoint,
+                             iteration=state['iteration'],
+                             states=state['states'],
+                             shots=state.get('shots'),
+                             optimizer=state.get('optimizer'),
+                             init_cost=1 - state['fidelity'])
+
+    def sweep(self, model, internuc_dist, states, n_iter=500,
+              step_size=(10 ** (-8)), seed=None, checkpoint_dir=None,
+              every=10, optimizer=None):
+        """Train each Internuclear Distance in Turn with Warm Starts
+
+        Neighbouring distances have nearly the same ground state, so each
+        distance starts from the optimum of the previous one instead of a
+        random draw from get_params. With a checkpoint directory every
+        distance keeps its own checkpoint: finished distances are skipped
+        and an interrupted one is resumed when the sweep is run again.
+
+        Args:
+            model: A string indicating which model to use
+            internuc_dist: array of R internuclear distances
+            states: (R, 16) array, the ground state at each distance
+            n_iter: An integer number of iterations per distance
+            step_size: An integer width for size of each step
+            seed: optional seed of the random hops
+            checkpoint_dir: optional directory of the checkpoints
+            every: number of hops between checkpoints
+            optimizer: optional optimizers.Optimizer backend replacing
+                basin-hopping
+
+        Returns:
+            list of dictionaries with the distance, params and fidelity
         """
+        circuit = self.get_circuit(model)
+        bounds = self.get_bounds(N_PARAMS[model])
+        params = self.get_params(N_PARAMS[model])
+        results = []
+
+        for index, r in enumerate(internuc_dist):
+            checkpoint = None
+            if checkpoint_dir is not None:
+                checkpoint = Checkpoint(os.path.join(
+                    checkpoint_dir, '%s_%03d.pkl' % (model, index)), every)
+
+            state = None if checkpoint is None else checkpoint.load()
 
-        # using L-BDGS-B minimizer method, fidelity is a static argument
-        minimizer = {"method": "L-BFGS-B",
-                     "args": (fidelity,), "bounds": bounds}
+            if state is not None and state['done']:
+                params, fidelity = state['params'], state['fidelity']
+            else:
+                if state is not None:
+                    res = self.resume(checkpoint)
+                else:
+                    res = self.optimize(circuit, model, params, bounds,
+                                        n_iter=n_iter, step_size=step_size,
+                                        seed=seed, checkpoint=checkpoint,
+                                        states=states[index:index + 1],
+                                        optimizer=optimizer)
+                params, fidelity = res.x, 1 - res.fun
 
-        return basinhopping(self.cost_func,
-                            init,
-                            niter=n_iter,
-                            stepsize=step_size,
-                            minimizer_kwargs=minimizer)
+            self.instrument.emit('distance', model=model, distance=r,
+                                 fidelity=fidelity, params=params)
+            results.append({'distance': r, 'params': params,
+                            'fidelity': fidelity})
+
+        return results
 
     def autoencoder(self, circuit, model, params, bounds):
         """
         """
+        if circuit.input_state is None:
+            circuit.input_state = self.init_state
+
         count = 0
 
         while count < 2:
             #
-            unitcell = circuit.get_unitary(circuit, params)
-            fidelity = circuit.compute_fidelity(unitcell)[0]
-            error = -np.log10(1 - abs(fidelity[0]))
+            fidelity = circuit.get_fidelity(model, params)
+            error = -np.log10(1 - abs(fidelity))
 
             # call basin hopping algorithms
-            res = self.optimize(fidelity, params, bounds)
+            res = self.optimize(circuit, model, params, bounds)
             # set new parameters
             params = res.x
 
-            print(error, np.log10(self.cost_func(params, fidelity)))
+            log_cost = np.log10(self.cost_func(params, circuit, model,
+                                               self.train_states))
+            self.instrument.emit('iteration', model=model, iteration=count,
+                                 error=error, log_cost=log_cost,
+                                 params=params)
+
+            print(error, log_cost)
             count += 1
 
         return params
@@ -111,16 +408,9 @@ class Autoencoder():
             Optimized parameters based on Basin-Hopping
         """
 
-        if model == 'a':
-            params = self.get_params(15)
-            bounds = self.get_bounds(15)
-            circuit = self.circuit_a
-        elif model == 'b':
-            params = self.get_params(3)
-            bounds = self.get_bounds(3)
-            circuit = self.circuit_b
-        else:
-            raise Exception('invalid entry')
+        circuit = self.get_circuit(model)
+        params = self.get_params(N_PARAMS[model])
+        bounds = self.get_bounds(N_PARAMS[model])
 
         return self.autoencoder(circuit, model, params, bounds)
 
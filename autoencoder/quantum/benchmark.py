@@ -0,0 +1,227 @@
+from argparse import ArgumentParser
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from circuit import Circuit
+from template import MODEL_A, MODEL_B, Template
+
+
+class Benchmark():
+    """Benchmarks of the Quantum Autoencoder Hot Paths
+
+    Times the unit cell construction, the swap test fidelity, the template
+    evolution with and without gate fusion, one cost evaluation, its scaling
+    with the training batch size, a fixed iteration basin-hopping run and
+    the Hartree Fock sweep. Each case reports
+    evaluations per second, timed without tracing, and the peak memory
+    traced over one more evaluation. Results are saved as JSON with the git
+    commit, so runs on different commits can be compared directly.
+
+    Attributes:
+        repeat: number of evaluations of each fast case
+        seed: seed of the random parameters and input states
+        batch_sizes: training batch sizes of the cost scaling case
+    """
+
+    def __init__(self, repeat=200, seed=0, batch_sizes=(1, 6, 50, 500)):
+        """ Init Benchmark
+        """
+        self.repeat = repeat
+        self.seed = seed
+        self.batch_sizes = batch_sizes
+
+    def random_states(self, batch):
+        """ Normalized Random 4 Qubit States
+
+        Returns:
+            (batch, 16) array
+        """
+        rng = np.random.RandomState(self.seed)
+        states = rng.randn(batch, 16) + 1j * rng.randn(batch, 16)
+
+        return states / np.linalg.norm(states, axis=1, keepdims=True)
+
+    def random_params(self, n_params):
+        """ Random Gate Parameters in the Optimization Bounds
+        """
+        return np.random.RandomState(self.seed).uniform(0, 4 * np.pi,
+                                                        n_params)
+
+    @staticmethod
+    def measure(name, func, number, children=False, **info):
+        """ Time a Case, then Trace the Memory of one more Evaluation
+
+        The timed evaluations run with tracemalloc off, since tracing slows
+        Python level code several times over.
+
+        Args:
+            name: name of the case
+            func: callable evaluated number times
+            number: number of evaluations
+            children: whether func runs worker processes, which tracemalloc
+                does not see
+            info: extra fields recorded with the result
+
+        Returns:
+            dictionary with the timing, evaluations per second and peak
+            traced memory of this process in bytes, with children also the
+            largest peak resident memory of a finished worker process in
+            bytes, or the error if the case failed
+        """
+        result = dict(info, name=name, number=number)
+
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            seconds = time.perf_counter() - start
+
+            tracemalloc.start()
+            try:
+                func()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        except Exception as error:
+            result['error'] = '%s: %s' % (type(error).__name__, error)
+            return result
+
+        result.update(seconds=seconds, evals_per_sec=number / seconds,
+                      peak_memory=peak)
+
+        if children:
+            # kilobytes on Linux, bytes on macOS
+            max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            if sys.platform != 'darwin':
+                max_rss *= 1024
+            result['children_max_rss'] = max_rss
+
+        return result
+
+    def run(self, n_iter=10):
+        """ Run all Cases
+
+        Args:
+            n_iter: basin-hopping iterations of the optimize case
+
+        Returns:
+            list of result dictionaries
+        """
+        from qutip import Qobj as Q
+
+        results = []
+        state = self.random_states(1)
+        input_state = Q(state[0].reshape(-1, 1), dims=[[2] * 4, [1] * 4])
+        n_params = {'a': 15, 'b': 3}
+
+        circuit = Circuit(2, input_state)
+        for model in ('a', 'b'):
+            params = self.random_params(n_params[model])
+            results.append(self.measure(
+                'get_unitary', lambda: circuit.get_unitary(model, params),
+                self.repeat, model=model))
+
+        for num_ref in (2, 3):
+            for method in ('swap_test', 'analytic'):
+                circuit = Circuit(num_ref, input_state, method=method)
+                unitary = circuit.get_unitary('a', self.random_params(15))
+                results.append(self.measure(
+                    'compute_fidelity',
+                    lambda: circuit.compute_fidelity(unitary), self.repeat,
+                    num_ref=num_ref, method=method))
+
+        states = self.random_states(self.batch_sizes[-1])
+        for model, layout in (('a', MODEL_A), ('b', MODEL_B)):
+            params = self.random_params(n_params[model])
+            for fusion in (False, True):
+                template = Template(layout, fusion=fusion)
+                results.append(self.measure(
+                    'template_run', lambda: template.run(params, states),
+                    self.repeat, model=model, fusion=fusion,
+                    batch=len(states), gate_counts=template.gate_counts()))
+
+        try:
+            from autoencoder import Autoencoder
+        except ImportError as error:
+            results.append({'name': 'autoencoder', 'error': str(error)})
+        else:
+            for batch in self.batch_sizes:
+                encoder = Autoencoder(self.random_states(batch))
+                for model, circuit in (('a', encoder.circuit_a),
+                                       ('b', encoder.circuit_b)):
+                    params = self.random_params(n_params[model])
+                    results.append(self.measure(
+                        'cost_func',
+                        lambda: encoder.cost_func(params, circuit, model,
+                                                  encoder.train_states),
+                        self.repeat, model=model, batch=batch))
+
+            encoder = Autoencoder(self.random_states(6))
+            for model, circuit in (('a', encoder.circuit_a),
+                                   ('b', encoder.circuit_b)):
+                params = self.random_params(n_params[model])
+                bounds = encoder.get_bounds(n_params[model])
+                results.append(self.measure(
+                    'optimize',
+                    lambda: encoder.optimize(circuit, model, params, bounds,
+                                             n_iter=n_iter, seed=self.seed),
+                    1, model=model, n_iter=n_iter))
+
+        try:
+            from hydrogen import Hydrogen
+        except ImportError as error:
+            results.append({'name': 'get_rhf_coeffs', 'error': str(error)})
+        else:
+            # bypass the dataset preparation and cache to time the sweep
+            hydrogen = Hydrogen(cache_dir=None, prepare=False)
+            results.append(self.measure('get_rhf_coeffs',
+                                        hydrogen.get_rhf_coeffs, 1,
+                                        children=True))
+
+        return results
+
+    @staticmethod
+    def save(results, path):
+        """ Save Results as JSON with the Environment they ran in
+
+        Args:
+            results: list of result dictionaries
+            path: output file
+        """
+        try:
+            commit = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'],
+                stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        report = {'commit': commit, 'time': time.time(),
+                  'python': platform.python_version(),
+                  'numpy': np.__version__, 'results': results}
+
+        with open(path, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Benchmark the quantum autoencoder')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--n-iter', type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark = Benchmark(repeat=args.repeat)
+    results = benchmark.run(n_iter=args.n_iter)
+
+    for result in results:
+        print(result['name'], result.get('evals_per_sec', result.get('error')))
+
+    benchmark.save(results, args.output)
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+
+import gates
+
+
+def fredkin_gate(num_qubits, targets):
+    """ Controlled Swap, the Control First in targets
+    """
+    from qutip import fredkin
+
+    return fredkin(num_qubits, control=targets[0], targets=list(targets[1:]))
+
+
+def swap_gate(num_qubits, targets):
+    """ Swap of two Qubits
+    """
+    from qutip import swap
+
+    return swap(num_qubits, targets=list(targets))
+
+
+def snot_gate(num_qubits, targets):
+    """ Hadamard on each Target Qubit
+    """
+    from qutip import qeye, snot, tensor
+
+    return tensor([snot() if qubit in targets else qeye(2)
+                   for qubit in range(num_qubits)])
+
+
+def entangle_operator(num_qubits, targets):
+    """ Two Qubit Entangling Gate
+    """
+    from qutip import Qobj as Q
+
+    return Q(gates.entangle_gate(), dims=[[2, 2], [2, 2]])
+
+
+# constant gates as functions of (num_qubits, targets), qutip is only
+# imported once one of them is built
+BUILDERS = {
+    'fredkin': fredkin_gate,
+    'swap': swap_gate,
+    'snot': snot_gate,
+    'entangle': entangle_operator,
+}
+
+
+class OperatorCache():
+    """Cache of Constant Operators
+
+    Circuit keeps rebuilding the same fredkin, swap, Hadamard and entangling
+    operators on every evaluation. They are stored here once, keyed by gate
+    name, number of qubits and targets, and the least recently used entry is
+    evicted once the cache is full. The hit and miss counters show whether a
+    steady state optimization still builds any of them.
+
+    Attributes:
+        maxsize: largest number of operators kept
+        hits: number of lookups served from the cache
+        misses: number of lookups that had to build the operator
+    """
+
+    def __init__(self, maxsize=32):
+        """ Init an Empty Cache
+
+        Args:
+            maxsize: largest number of operators kept
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.operators = OrderedDict()
+
+    def get(self, name, num_qubits, targets):
+        """ Retrieve a Constant Operator
+
+        Args:
+            name: one of the gate names in BUILDERS
+            num_qubits: number of qubits the operator acts on
+            targets: qubits of the gate, the control first for 'fredkin'
+
+        Returns:
+            the operator as a Qobj, which must not be modified
+        """
+        key = (name, num_qubits, tuple(targets))
+
+        if key in self.operators:
+            self.hits += 1
+            self.operators.move_to_end(key)
+            return self.operators[key]
+
+        if name not in BUILDERS:
+            raise Exception('No constant operator named %s' % name)
+
+        self.misses += 1
+        operator = BUILDERS[name](num_qubits, tuple(targets))
+        self.operators[key] = operator
+
+        if len(self.operators) > self.maxsize:
+            self.operators.popitem(last=False)
+
+        return operator
+
+    def stats(self):
+        """ Cache Counters
+
+        Returns:
+            dictionary of hits, misses and the current number of operators
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.operators)}
+
+    def clear(self):
+        """ Drop all Operators and Reset the Counters
+        """
+        self.operators.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# shared by every Circuit
+operators = OperatorCache()
@@ -0,0 +1,54 @@
+import os
+import pickle
+
+
+class Checkpoint():
+    """Snapshot of a Basin-Hopping Run on Disk
+
+    Autoencoder.optimize writes the best parameters so far, their fidelity,
+    the iteration reached and the state of both random generators every few
+    hops, so a killed job can continue with Autoencoder.resume instead of
+    starting over. Snapshots are written under a temporary name and moved
+    into place, so a crash mid-write leaves the previous one intact.
+
+    Attributes:
+        path: file holding the latest snapshot
+        every: number of hops between snapshots
+    """
+
+    def __init__(self, path, every=10):
+        """ Init Checkpoint
+
+        Args:
+            path: file holding the latest snapshot
+            every: number of hops between snapshots
+        """
+        self.path = path
+        self.every = every
+
+    def save(self, state):
+        """ Write a Snapshot
+
+        Args:
+            state: dictionary of picklable values
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        partial = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(partial, 'wb') as handle:
+            pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, self.path)
+
+    def load(self):
+        """ Read the Latest Snapshot
+
+        Returns:
+            the saved dictionary, or None when nothing was saved yet
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'rb') as handle:
+            return pickle.load(handle)
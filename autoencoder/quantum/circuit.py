@@ -1,6 +1,13 @@
 import numpy as np
-from qutip import basis, swap, qeye, snot, tensor, sigmax, sigmay, sigmaz, fredkin
-from qutip import Qobj as Q
+
+import gates
+from cache import operators
+from instrument import Instrument
+from template import MODEL_A, Template, brick_wall, model_b
+
+
+# complex dtype of the statevector simulation for each precision mode
+PRECISION = {'double': np.complex128, 'single': np.complex64}
 
 
 class Circuit():
@@ -14,47 +21,121 @@ class Circuit():
     of this decomposition is that it allows us to map the operations into
     real, physically implementable, operations on quantum systems.
 
+    The 4 input qubits of molecular hydrogen are the default. Wider inputs
+    replace model a by brick-wall layers of the same two-qubit unit cell and
+    extend model b to rotate every qubit. They are only ever simulated on
+    the statevector, so 12 to 20 qubit inputs fit in memory with the
+    analytic fidelity method.
+
     Attributes:
         input_state: generate a set of input states of molecular hydrogen at
             different internuclear distances (r).
+        method: 'swap_test' to simulate the swap test register, or
+            'analytic' to read the same probability off the trash qubits
+        instrument: Instrument timing the unitary, evolve, fidelity and
+            gradient stages of the batched evaluations
+        num_qubits: number of input qubits
+        trash: indices of the input qubits compared to the references
+        dtype: complex dtype of the statevector simulation
     """
 
-    def __init__(self, num_ref, input_state):
+    def __init__(self, num_ref, input_state, method='swap_test',
+                 instrument=None, num_qubits=4, trash=None, layers=2,
+                 precision='double'):
         """ Init Circuit with molecular hydrogen states
 
+        Args:
+            num_ref: number of reference (and trash) qubits
+            input_state: Qobj ket of num_qubits qubits
+            method: 'swap_test' or 'analytic'
+            instrument: optional Instrument
+            num_qubits: number of input qubits
+            trash: indices of the trash qubits, the first num_ref by default
+            layers: brick-wall layers of model a when num_qubits is not 4
+            precision: 'double', or 'single' to run the batched statevector
+                paths in complex64, halving their memory and bandwidth
+
         Raises:
             Exception: An error if number of references is not 2 or 3 qubits
+                for 4 input qubits or leaves no latent qubit otherwise, if
+                the trash indices do not match, or the fidelity method or
+                precision is unknown
         """
-        if num_ref > 3 or num_ref < 2:
+        if num_qubits == 4 and (num_ref > 3 or num_ref < 2):
             raise Exception('Compression valid for only 2 and 3 qubits')
+        elif num_ref < 1 or num_ref >= num_qubits:
+            raise Exception('Compression needs 1 to %d trash qubits'
+                            % (num_qubits - 1))
         else:
             self.num_ref = num_ref
 
+        self.num_qubits = num_qubits
+        self.trash = list(range(num_ref)) if trash is None else list(trash)
+
+        if len(self.trash) != num_ref or len(set(self.trash)) != num_ref or \
+                not set(self.trash) <= set(range(num_qubits)):
+            raise Exception('Trash must be %d distinct input qubits' % num_ref)
+
+        if method not in ('swap_test', 'analytic'):
+            raise Exception('Fidelity method must be swap_test or analytic')
+        else:
+            self.method = method
+
+        if precision not in PRECISION:
+            raise Exception('Precision must be double or single')
+        else:
+            self.dtype = PRECISION[precision]
+
         # ground states = training set
         self.input_state = input_state
 
+        # gate layouts, compiled once and rebound for every evaluation
+        if num_qubits == 4:
+            layout_a = MODEL_A
+        else:
+            layout_a = brick_wall(num_qubits, layers)
+
+        self.templates = {
+            'a': Template(layout_a, num_qubits, dtype=self.dtype),
+            'b': Template(model_b(num_qubits), num_qubits, dtype=self.dtype)}
+
+        self.instrument = Instrument() if instrument is None else instrument
+
+    def gate_counts(self):
+        """ Contractions per Evaluation before and after Gate Fusion
+
+        Returns:
+            dictionary of model to Template.gate_counts
+        """
+        return dict((model, template.gate_counts())
+                    for model, template in self.templates.items())
+
     # TODO: implement visualization of circuit unit cells
     def visualize_circuits(self):
         """ Visualization of Circuits using QuTip library
         """
         pass
 
-    @staticmethod
-    def swap_test(system_state):
+    def swap_test(self, system_state):
         """ Perform a Swap Test on Entangled States
 
         Given the entangled states representing the entire system, perform the
         swap test protocol to ...
 
         Args:
-            system_state:
+            system_state: measurement qubit, references and input qubits
 
         Returns:
             state with swapped qubits
         """
-        c_swap = fredkin(7, control=0, targets=[1, 3]) * fredkin(7, control=0,
-                                                                 targets=[2, 4])
-        swap_state = c_swap * system_state
+        num_qubits = 1 + self.num_ref + self.num_qubits
+
+        # reference i is swapped with the i-th trash qubit
+        swap_state = system_state
+        for ref, trash in enumerate(self.trash):
+            swap_state = operators.get(
+                'fredkin', num_qubits,
+                (0, 1 + ref, 1 + self.num_ref + trash)) * swap_state
 
         return swap_state
 
@@ -69,8 +150,7 @@ class Circuit():
         Returns:
             returns the fidelity of the trash state
         """
-        hadamard = tensor(snot(), qeye(2), qeye(2), qeye(2), qeye(2), qeye(2),
-                          qeye(2))
+        hadamard = operators.get('snot', len(meas_state.dims[0]), (0,))
 
         meas_state = hadamard * meas_state
 
@@ -89,8 +169,9 @@ class Circuit():
         Returns:
 
         """
-        return Q.expm(-1j * theta * (np.cos(phi) * sigmax() +
-                                     np.sin(phi) * sigmay()) / 2)
+        from qutip import Qobj as Q
+
+        return Q(gates.rotation_xy(theta, phi))
 
     @staticmethod
     def rotation_z(phi):
@@ -102,7 +183,9 @@ class Circuit():
         Returns:
 
         """
-        return Q.expm(-1j * phi * sigmaz() / 2)
+        from qutip import Qobj as Q
+
+        return Q(gates.rotation_z(phi))
 
     @staticmethod
     def entangle_gate():
@@ -116,7 +199,7 @@ class Circuit():
         Returns:
 
         """
-        return np.exp((1j * np.pi) / 4) * Q.expm((1j * np.pi) / 4 * tensor(sigmaz(), sigmaz()))
+        return operators.get('entangle', 2, (0, 1))
 
     def compute_fidelity(self, unitary):
         """Compute Fidelity between Encoded and Trash States
@@ -128,15 +211,282 @@ class Circuit():
             The fidelity of the input parameters using one of two Circuit
             models
         """
+        # apply unitary to input statess
+        evolved_state = unitary * self.input_state
+
+        return self.overlap(evolved_state)
+
+    def get_fidelity(self, circuit, params):
+        """Compute Fidelity using the Statevector Engine
+
+        Same quantity as compute_fidelity, but the input state is evolved gate
+        by gate instead of through the unit cell unitary.
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+
+        Return:
+            The fidelity of the input parameters
+        """
+        return self.overlap(self.evolve(circuit, params))
+
+    def check_fidelity(self, circuit, params, tol=1e-10):
+        """Cross-check the Analytic Fidelity against the Swap Test
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            tol: largest accepted difference between the two methods
+
+        Return:
+            The fidelity of the input parameters
+
+        Raises:
+            Exception: An error if the two methods disagree
+        """
+        evolved_state = self.evolve(circuit, params)
+        simulated = self.swap_test_overlap(evolved_state)
+        analytic = self.trash_overlap(evolved_state)
+
+        if abs(simulated - analytic) > tol:
+            raise Exception('Analytic fidelity %s differs from swap test %s'
+                            % (analytic, simulated))
+
+        return analytic
+
+    def check_precision(self, circuit, params, states, tol=1e-4):
+        """Cross-check the Fidelity against Double Precision
+
+        Compares the error metric -log10(1 - |F|) that
+        Autoencoder.autoencoder reports, computed in this circuit's
+        precision and in double precision. Single precision keeps the
+        fidelity within about 1e-7 of double, and the metric scales a
+        fidelity error e to about e / ((1 - F) ln 10). The default tol
+        therefore holds up to 1 - F of about 1e-3, an error metric of about
+        3, beyond which single precision cannot resolve the metric to tol.
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            states: (B, 2^n) array of input states
+            tol: largest accepted difference of the error metric
+
+        Return:
+            The error metric in this precision and in double precision
+
+        Raises:
+            Exception: An error if the two precisions disagree
+        """
+        template = self.templates[circuit]
+        errors = []
+
+        for dtype in (self.dtype, np.complex128):
+            evolved_states = template.astype(dtype).run(params, states)
+            fidelity = np.mean(self.trash_probabilities(evolved_states))
+            errors.append(-np.log10(1 - abs(float(fidelity))))
+
+        if abs(errors[0] - errors[1]) > tol:
+            raise Exception('Error metric %s differs from double precision %s'
+                            % tuple(errors))
+
+        return errors[0], errors[1]
+
+    def overlap(self, evolved_state):
+        """Overlap between Trash and Reference Qubits
+
+        Args:
+            evolved_state: input state after the unit cell
+
+        Return:
+            The probability of measuring 0 on the swap test ancilla
+        """
+        if self.method == 'analytic':
+            return self.trash_overlap(evolved_state)
+
+        return self.swap_test_overlap(evolved_state)
+
+    def trash_overlap(self, evolved_state):
+        """Swap Test Probability from the Trash Density Matrix
+
+        The swap test against |0...0> reference qubits measures 0 with
+        probability (1 + F) / 2, where F = <0...0|rho_trash|0...0> and
+        rho_trash is the partial trace of the evolved state onto the trash
+        qubits, so the 7 qubit register never has to be built.
+
+        Args:
+            evolved_state: input state after the unit cell
+
+        Return:
+            The probability of measuring 0 on the swap test ancilla
+        """
+        return self.trash_probabilities(evolved_state.full().reshape(1, -1))[0]
+
+    def trash_zero(self, states):
+        """Amplitudes with every Trash Qubit in |0>
+
+        Args:
+            states: (B, 2^n) array
+
+        Return:
+            (B, 2^(n - num_ref)) view over the latent qubits
+        """
+        tensor = np.reshape(states, (len(states),) + (2,) * self.num_qubits)
+        index = tuple(0 if qubit in self.trash else slice(None)
+                      for qubit in range(self.num_qubits))
+
+        return tensor[(slice(None),) + index].reshape(len(states), -1)
+
+    def trash_projection(self, states):
+        """States Projected onto every Trash Qubit in |0>
+
+        Args:
+            states: (B, 2^n) array
+
+        Return:
+            (B, 2^n) array, zero wherever a trash qubit is |1>
+        """
+        mask = np.zeros((2,) * self.num_qubits, dtype=bool)
+        mask[tuple(0 if qubit in self.trash else slice(None)
+                   for qubit in range(self.num_qubits))] = True
+
+        return np.where(mask.ravel(), states, 0)
+
+    def trash_probabilities(self, evolved_states):
+        """Swap Test Probabilities for a Batch of Evolved States
+
+        Args:
+            evolved_states: (B, 2^n) array of input states after the unit cell
+
+        Return:
+            (B,) array of probabilities of measuring 0 on the ancilla
+        """
+        # only the <0...0|rho_trash|0...0> element of each trace is needed
+        fidelity = np.sum(np.abs(self.trash_zero(evolved_states)) ** 2, axis=1)
+
+        return (1 + fidelity) / 2
+
+    def batch_fidelity(self, circuit, params, states):
+        """Average Fidelity over a Batch of Input States
+
+        The whole batch is evolved as one (B, 2, 2, 2, 2) tensor, so the cost
+        of the training set average stays close to that of a single state.
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            states: (B, 2^n) array of input states, e.g. Hydrogen.train_states
+
+        Return:
+            The swap test probability averaged over the batch
+        """
+        evolved_states = self.evolve_batch(circuit, params, states)
+
+        with self.instrument.stage('fidelity'):
+            return np.mean(self.trash_probabilities(evolved_states))
+
+    def fidelity_gradient(self, circuit, params, states):
+        """Average Fidelity and its Exact Gradient
+
+        Every parameterised gate is differentiated in closed form, and the
+        contributions of all its occurrences are gathered by one backward
+        sweep over the circuit, Template.gradient, from the evolved states
+        projected onto the trash |0> subspace. The gradient costs about two
+        runs of the circuit, against the len(params) + 1 evaluations of a
+        finite difference estimate.
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            states: (B, 2^n) array of input states
+
+        Return:
+            The batch averaged fidelity and its gradient with respect to the
+            params of the model (15 for 'a', 3 for 'b')
+        """
+        states = np.reshape(states, (-1, 2 ** self.num_qubits))
+        template = self.templates[circuit]
+
+        with self.instrument.stage('unitary'):
+            bound = template.bind_params(params)
+
+        with self.instrument.stage('evolve'):
+            evolved_states = template.run(params, states, bound=bound)
+
+        with self.instrument.stage('gradient'):
+            # P = (1 + sum_l |psi_0l|^2) / 2, so
+            # dP = Re sum_l conj(psi_0l) dpsi_0l
+            gradient = template.gradient(
+                params, evolved_states, self.trash_projection(evolved_states),
+                bound=bound) / len(states)
+
+        with self.instrument.stage('fidelity'):
+            fidelity = np.mean(self.trash_probabilities(evolved_states))
+
+        return fidelity, gradient
+
+    def batch_fidelities(self, circuit, params, states, shots=None,
+                         rng=None):
+        """Average Fidelity for a Batch of Parameter Vectors
+
+        Without shots this is batch_fidelity for each parameter vector. With
+        shots, every input state is measured shots times per parameter vector
+        and the ancilla count of 0 is drawn from the binomial distribution of
+        the swap test probability, the estimate hardware would return. One
+        draw covers all the shots, so millions of shots cost the same as one.
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: (P, n_params) array, or a single parameter vector
+            states: (B, 2^n) array of input states
+            shots: optional number of swap test shots per state
+            rng: numpy RandomState of the shots, numpy.random by default
+
+        Return:
+            (P,) array of the average swap test probabilities, or their
+            estimates, a float for a single parameter vector
+        """
+        single = np.ndim(params) == 1
+        template = self.templates[circuit]
+
+        with self.instrument.stage('unitary'):
+            bound = template.bind_params(np.atleast_2d(params))
+
+        with self.instrument.stage('evolve'):
+            evolved_states = template.run_paired(params, states, bound=bound)
+
+        with self.instrument.stage('fidelity'):
+            probabilities = self.trash_probabilities(
+                evolved_states.reshape(-1, evolved_states.shape[-1])
+            ).reshape(evolved_states.shape[:2])
+
+            if shots is not None:
+                rng = np.random if rng is None else rng
+                probabilities = rng.binomial(
+                    shots, np.clip(probabilities, 0, 1)) / float(shots)
+                self.instrument.count('shots', probabilities.size * shots)
+
+            fidelities = np.mean(probabilities, axis=1)
+
+        return fidelities[0] if single else fidelities
+
+    def swap_test_overlap(self, evolved_state):
+        """Swap Test between Trash and Reference Qubits
+
+        Args:
+            evolved_state: input state after the unit cell
+
+        Return:
+            The probability of measuring 0 on the swap test ancilla
+        """
+        from qutip import basis, snot, tensor
+
         # initialize measurement qubit
         meas_qb = basis(2, 0)
 
         # initialize reference qubits
         ref_qb = tensor([basis(2, 0) for i in range(self.num_ref)])
 
-        # apply unitary to input statess
-        evolved_state = unitary * self.input_state
-
         # apply swap test on compressed qubits
         state = tensor(meas_qb, ref_qb, evolved_state)
         state2 = tensor(snot() * meas_qb, ref_qb, evolved_state)
@@ -145,7 +495,7 @@ class Circuit():
         # compute overlap = fidelity
         fidelity = self.measure_overlap(meas_state, state)
 
-        return fidelity
+        return fidelity.full()[0, 0].real
 
     def get_unitary(self, circuit, params):
         """ Get Unitary based on User Input
@@ -157,10 +507,53 @@ class Circuit():
         Returns:
             unitary matrix representing the unit cell of model a or b, based on
             user's input
+
+        Raises:
+            Exception: An error if the input is not 4 qubits
         """
+        if self.num_qubits != 4:
+            raise Exception('Unit cell unitaries are only built for 4 qubits')
+
         return self.unitary_a(params) if circuit == 'a' else \
             self.unitary_b(params)
 
+    def evolve(self, circuit, params):
+        """ Evolve Input State based on User Input
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+
+        Returns:
+            ket of the input state after the unit cell of model a or b
+        """
+        from qutip import Qobj as Q
+
+        evolved_states = self.evolve_batch(circuit, params,
+                                           self.input_state.full())
+
+        return Q(evolved_states[0].reshape(-1, 1),
+                 dims=[[2] * self.num_qubits, [1] * self.num_qubits])
+
+    def evolve_batch(self, circuit, params, states):
+        """ Evolve a Batch of Input States
+
+        Args:
+            circuit: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            states: (B, 2^n) array of input states
+
+        Returns:
+            (B, 2^n) array of the states after the unit cell of model a or b
+        """
+        template = self.templates[circuit]
+
+        with self.instrument.stage('unitary'):
+            bound = template.bind_params(params)
+
+        with self.instrument.stage('evolve'):
+            return template.run(params, states, bound=bound)
+
     def unitary_a(self, params):
         """ Circuit Model A Decomposition
 
@@ -171,6 +564,8 @@ class Circuit():
             unit cell unitary that represents the transformation on the 4 qubit
             input state
         """
+        from qutip import qeye, tensor
+
         unit = self.unitary(params)
         identity = qeye(2)
 
@@ -179,13 +574,14 @@ class Circuit():
         unitary_3 = tensor(identity, identity, unit)
 
         # swap qubits 1 and 2, perform tensor, swap 2 and 1
-        unitary_4 = swap(4, targets=[0, 1]) * unitary_2 * \
-            swap(4, targets=[1, 0])
-        unitary_5 = swap(4, targets=[1, 2]) * unitary_3 * \
-            swap(4, targets=[2, 1])
+        swap_01 = operators.get('swap', 4, (0, 1))
+        swap_12 = operators.get('swap', 4, (1, 2))
+        swap_23 = operators.get('swap', 4, (2, 3))
+
+        unitary_4 = swap_01 * unitary_2 * swap_01
+        unitary_5 = swap_12 * unitary_3 * swap_12
 
-        unitary_6 = swap(4, targets=[2, 3]) * swap(4, targets=[1, 2]) * unitary_1 \
-            * swap(4, targets=[3, 2]) * swap(4, targets=[2, 1])
+        unitary_6 = swap_23 * swap_12 * unitary_1 * swap_23 * swap_12
 
         output_unitary = unitary_1 * unitary_2 * unitary_3 * unitary_4 * \
             unitary_5 * unitary_6
@@ -196,6 +592,8 @@ class Circuit():
         """ Circuit Model B Decomposition
 
         """
+        from qutip import qeye, tensor
+
         rotate_qb = self.single_qubit_gate(params[0], params[1], params[2])
         identity = qeye(2)
 
@@ -220,7 +618,9 @@ class Circuit():
         Retrieve a single-qubit unitary given 3 classical inputs. The rotation
         can be decomposed into the matrix product of Rz * Rxy
         """
-        return self.rotation_z(phi_z) * self.rotation_xy(theta, phi)
+        from qutip import Qobj as Q
+
+        return Q(gates.single_qubit_gate(theta, phi, phi_z))
 
     def V_gate(self, alpha, beta, delta):
         """ V
@@ -233,13 +633,9 @@ class Circuit():
         Return:
 
         """
+        from qutip import Qobj as Q
 
-        op1 = tensor(self.rotation_xy(beta, np.pi / 2),
-                     self.rotation_xy(3 * np.pi / 2, delta))
-        op2 = tensor(self.rotation_xy(alpha, 0),
-                     self.rotation_xy(3 * np.pi / 2, 0))
-
-        return self.entangle_gate() * op1 * self.entangle_gate() * op2
+        return Q(gates.v_gate(alpha, beta, delta), dims=[[2, 2], [2, 2]])
 
     def unitary(self, params):
         """ Two-Qubit Gate Decomposition
@@ -257,13 +653,6 @@ class Circuit():
             Two qubit gate decomposition unitary matrix that can be directly
             applied to qubit states
         """
+        from qutip import Qobj as Q
 
-        rotation_1 = tensor(self.single_qubit_gate(params[0], params[1], params[2]),
-                            self.single_qubit_gate(params[3], params[4], params[5]))
-
-        rotation_2 = tensor(self.single_qubit_gate(params[9], params[10], params[11]),
-                            self.single_qubit_gate(params[12], params[13], params[14]))
-
-        v_unitary = self.V_gate(params[6], params[7], params[8])
-
-        return rotation_2 * v_unitary * rotation_1
+        return Q(gates.two_qubit_gate(params), dims=[[2, 2], [2, 2]])
@@ -0,0 +1,130 @@
+from argparse import ArgumentParser
+from random import seed as random_seed
+import time
+
+from autoencoder import N_PARAMS, Autoencoder
+from benchmark import Benchmark
+from optimizers import OPTIMIZERS
+
+
+class Comparison():
+    """Fidelity against Wall-Clock Time of the Optimizer Backends
+
+    Trains models 'a' and 'b' from the same seeded start with basin-hopping
+    and each optimizer backend, for at most n_iter steps or time_limit
+    seconds. Every step is traced with its wall-clock time, so the backends
+    can be compared on the best fidelity they reach within fixed time
+    budgets rather than per iteration, which costs very differently for
+    each. The swap test fidelity is at least 0.5, so the gain over the
+    start is what the time buys.
+
+    Attributes:
+        train_states: (B, 16) array of training states
+        n_iter: maximum steps of each backend, hops for basin-hopping
+        time_limit: optional wall-clock seconds per run
+        seed: seed of the initial parameters and of the backends
+        step_size: basin-hopping hop width
+        budgets: wall-clock seconds at which the best fidelity is reported
+    """
+
+    def __init__(self, train_states, n_iter=200, time_limit=None, seed=0,
+                 step_size=(10 ** (-8)), budgets=(0.1, 1., 10.)):
+        """ Init Comparison
+        """
+        self.train_states = train_states
+        self.n_iter = n_iter
+        self.time_limit = time_limit
+        self.seed = seed
+        self.step_size = step_size
+        self.budgets = budgets
+
+    def fidelity_at(self, trace, initial):
+        """ Best Traced Fidelity within each Time Budget
+
+        Returns:
+            list of (budget, fidelity) pairs, the initial fidelity for a
+            budget before the first step
+        """
+        return [(budget, max([initial] + [fidelity for seconds, fidelity
+                                          in trace if seconds <= budget]))
+                for budget in self.budgets]
+
+    def run_backend(self, model, name):
+        """ Train a Model with one Backend
+
+        Args:
+            model: A string indicating which model to use
+            name: 'basinhopping' or a key of optimizers.OPTIMIZERS
+
+        Returns:
+            dictionary with the initial and best fidelity, wall-clock
+            seconds, fidelity gained per second, best fidelity within each
+            budget, cost evaluations and the trace of (seconds, fidelity)
+        """
+        random_seed(self.seed)
+        encoder = Autoencoder(self.train_states)
+        circuit = encoder.get_circuit(model)
+        params = encoder.get_params(N_PARAMS[model])
+        initial = circuit.batch_fidelity(model, params, self.train_states)
+        optimizer = None if name == 'basinhopping' else OPTIMIZERS[name]()
+        trace = []
+
+        def callback(x, cost, accept):
+            trace.append((time.perf_counter() - start, 1 - cost))
+
+            return self.time_limit is not None and \
+                trace[-1][0] > self.time_limit
+
+        start = time.perf_counter()
+        res = encoder.optimize(circuit, model, params,
+                               encoder.get_bounds(N_PARAMS[model]),
+                               n_iter=self.n_iter, step_size=self.step_size,
+                               callback=callback, seed=self.seed,
+                               optimizer=optimizer)
+        seconds = time.perf_counter() - start
+
+        fidelity = circuit.batch_fidelity(model, res.x, self.train_states)
+
+        return {'name': name, 'model': model, 'initial_fidelity': initial,
+                'fidelity': fidelity, 'seconds': seconds,
+                'gain_per_sec': (fidelity - initial) / seconds,
+                'fidelity_at': self.fidelity_at(trace, initial),
+                'cost_evals': encoder.instrument.counters.get('cost_evals'),
+                'steps': len(trace), 'trace': trace}
+
+    def run(self, models=('a', 'b'), backends=None):
+        """ Run every Backend on every Model
+
+        Args:
+            models: models to train
+            backends: backend names, basin-hopping and all of
+                optimizers.OPTIMIZERS when None
+
+        Returns:
+            list of result dictionaries
+        """
+        if backends is None:
+            backends = ['basinhopping'] + sorted(OPTIMIZERS)
+
+        return [self.run_backend(model, name)
+                for model in models for name in backends]
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Compare the optimizer backends')
+    parser.add_argument('--output', default='compare.json')
+    parser.add_argument('--n-iter', type=int, default=200)
+    parser.add_argument('--time-limit', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    comparison = Comparison(Autoencoder().train_states, n_iter=args.n_iter,
+                            time_limit=args.time_limit, seed=args.seed)
+    results = comparison.run()
+
+    for result in results:
+        print(result['model'], result['name'], result['fidelity'],
+              result['seconds'], result['fidelity_at'])
+
+    Benchmark.save(results, args.output)
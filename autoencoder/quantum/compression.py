@@ -0,0 +1,179 @@
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class Compressor():
+    """Streaming Compression and Decompression with Trained Parameters
+
+    The encoder is the unit cell U of model a or b bound to trained params,
+    the decoder its inverse. States are read in chunks from an array, a
+    memory map or a .npy file, so memory is bounded by the chunk size and
+    not the dataset. The gate matrices are bound once; for up to
+    max_dense_qubits qubits the whole unitary is also built once and each
+    chunk is a single matrix product.
+
+    Compressing keeps the latent qubits of U|psi> with every trash qubit
+    projected on |0>, normalized. Decompressing resets the trash qubits to
+    |0> and applies U^dagger, so |<psi|U^dagger(latent x 0)>|^2 is the
+    squared norm of that projection, i.e. the trash fidelity of |psi>.
+
+    Attributes:
+        circuit: Circuit holding the compiled templates and trash qubits
+        model: model 'a' or 'b'
+        params: trained parameters of the model
+        chunk_size: number of states evolved at a time
+        unitary: (2^n, 2^n) array whose rows are U|i>, None above
+            max_dense_qubits
+    """
+
+    def __init__(self, circuit, model, params, chunk_size=1024,
+                 max_dense_qubits=10):
+        """ Init Compressor
+
+        Args:
+            circuit: Circuit with the num_qubits and trash of the training
+            model: model 'a' or 'b'
+            params: trained parameters of the model
+            chunk_size: number of states evolved at a time
+            max_dense_qubits: widest input whose unitary is built densely
+        """
+        self.circuit = circuit
+        self.model = model
+        self.params = np.asarray(params, dtype=float)
+        self.chunk_size = chunk_size
+
+        self.template = circuit.templates[model]
+        self.bound = self.template.bind_params(self.params)
+
+        dim = 2 ** circuit.num_qubits
+        if circuit.num_qubits <= max_dense_qubits:
+            self.unitary = self.template.run(self.params, np.eye(dim),
+                                             bound=self.bound)
+        else:
+            self.unitary = None
+
+        self.latent = [qubit for qubit in range(circuit.num_qubits)
+                       if qubit not in circuit.trash]
+
+    @staticmethod
+    def chunks(source, chunk_size, dtype=complex):
+        """ Read a Collection of States in Chunks
+
+        Args:
+            source: (N, 2^n) array or memory map, or path of a .npy file
+                which is memory mapped
+            chunk_size: number of states per chunk
+            dtype: complex dtype of the chunks
+
+        Returns:
+            generator of (<= chunk_size, 2^n) arrays
+        """
+        if isinstance(source, str):
+            source = np.load(source, mmap_mode='r')
+
+        for start in range(0, len(source), chunk_size):
+            yield np.asarray(source[start:start + chunk_size], dtype=dtype)
+
+    def encode(self, states):
+        """ Apply U to a Chunk
+
+        Returns:
+            (B, 2^n) array
+        """
+        if self.unitary is not None:
+            return np.dot(states, self.unitary)
+
+        return self.template.run(self.params, states, bound=self.bound)
+
+    def decode(self, states):
+        """ Apply U^dagger to a Chunk
+
+        Returns:
+            (B, 2^n) array
+        """
+        if self.unitary is not None:
+            return np.dot(states, self.unitary.conj().T)
+
+        return self.template.run_adjoint(self.params, states, bound=self.bound)
+
+    def embed(self, latents):
+        """ Latent States with every Trash Qubit in |0>
+
+        Args:
+            latents: (B, 2^(n - num_ref)) array
+
+        Returns:
+            (B, 2^n) array
+        """
+        num_qubits = self.circuit.num_qubits
+        states = np.zeros((len(latents),) + (2,) * num_qubits,
+                          dtype=self.template.dtype)
+        index = tuple(0 if qubit in self.circuit.trash else slice(None)
+                      for qubit in range(num_qubits))
+        states[(slice(None),) + index] = np.reshape(
+            latents, (len(latents),) + (2,) * len(self.latent))
+
+        return states.reshape(len(latents), -1)
+
+    def compress(self, source):
+        """ Stream States through the Encoder
+
+        Args:
+            source: states as accepted by chunks
+
+        Returns:
+            generator of (B, 2^(n - num_ref)) normalized latent states and
+            (B,) reconstruction fidelities, one pair per chunk
+        """
+        for states in self.chunks(source, self.chunk_size,
+                                  self.template.dtype):
+            amplitudes = self.circuit.trash_zero(self.encode(states))
+            fidelities = np.sum(np.abs(amplitudes) ** 2, axis=1)
+
+            # a state orthogonal to the code space has nothing to keep
+            norms = np.sqrt(np.where(fidelities > 0, fidelities, 1))
+
+            yield amplitudes / norms[:, None], fidelities
+
+    def decompress(self, source):
+        """ Stream Latent States through the Decoder
+
+        Args:
+            source: latent states as accepted by chunks
+
+        Returns:
+            generator of (B, 2^n) reconstructed states, one per chunk
+        """
+        for latents in self.chunks(source, self.chunk_size,
+                                   self.template.dtype):
+            yield self.decode(self.embed(latents))
+
+    def compress_to(self, source, path):
+        """ Compress a Collection into a .npy File
+
+        Only one chunk is held in memory, the latent states are written
+        through a memory map.
+
+        Args:
+            source: states as accepted by chunks
+            path: .npy file receiving the (N, 2^(n - num_ref)) latent states
+
+        Returns:
+            (N,) array of reconstruction fidelities
+        """
+        if isinstance(source, str):
+            source = np.load(source, mmap_mode='r')
+
+        output = open_memmap(path, mode='w+', dtype=self.template.dtype,
+                             shape=(len(source), 2 ** len(self.latent)))
+        fidelities = np.empty(len(source))
+
+        start = 0
+        for latents, fidelity in self.compress(source):
+            output[start:start + len(latents)] = latents
+            fidelities[start:start + len(latents)] = fidelity
+            start += len(latents)
+
+        output.flush()
+
+        return fidelities
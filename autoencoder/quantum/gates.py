@@ -0,0 +1,247 @@
+"""Closed-form Gate Kernels
+
+NumPy versions of the rotations used by Circuit, written out in cos/sin form
+instead of exponentiating Pauli matrices. Every kernel broadcasts over its
+angle arguments: scalar angles give a single (2, 2) or (4, 4) matrix and
+arrays of N angles give (N, 2, 2) or (N, 4, 4) stacks.
+"""
+import numpy as np
+
+
+def kron(gate_a, gate_b):
+    """ Tensor Product of two (stacks of) Single Qubit Gates
+
+    Args:
+        gate_a: (..., 2, 2) array acting on the first (most significant) qubit
+        gate_b: (..., 2, 2) array acting on the second qubit
+
+    Returns:
+        (..., 4, 4) array
+    """
+    gate_a, gate_b = np.broadcast_arrays(gate_a, gate_b)
+    product = np.einsum('...ij,...kl->...ikjl', gate_a, gate_b)
+
+    return product.reshape(gate_a.shape[:-2] + (4, 4))
+
+
+def rotation_xy(theta, phi):
+    """ XY Rotation Matrix
+
+    exp(-i theta (cos(phi) X + sin(phi) Y) / 2)
+
+    Args:
+        theta: rotation angle(s)
+        phi: angle(s) of the rotation axis in the xy plane
+
+    Returns:
+        (..., 2, 2) array
+    """
+    theta, phi = np.broadcast_arrays(np.asarray(theta, dtype=float),
+                                     np.asarray(phi, dtype=float))
+    cos = np.cos(theta / 2)
+    sin = -1j * np.sin(theta / 2)
+
+    gate = np.empty(theta.shape + (2, 2), dtype=complex)
+    gate[..., 0, 0] = cos
+    gate[..., 0, 1] = sin * np.exp(-1j * phi)
+    gate[..., 1, 0] = sin * np.exp(1j * phi)
+    gate[..., 1, 1] = cos
+
+    return gate
+
+
+def rotation_z(phi):
+    """ Z Rotation Matrix
+
+    exp(-i phi Z / 2)
+
+    Args:
+        phi: rotation angle(s)
+
+    Returns:
+        (..., 2, 2) array
+    """
+    phi = np.asarray(phi, dtype=float)
+
+    gate = np.zeros(phi.shape + (2, 2), dtype=complex)
+    gate[..., 0, 0] = np.exp(-0.5j * phi)
+    gate[..., 1, 1] = np.exp(0.5j * phi)
+
+    return gate
+
+
+def entangle_gate():
+    """ Entangle Gate Matrix
+
+    exp(i pi / 4) exp(i pi / 4 Z x Z), which is diagonal
+
+    Returns:
+        (4, 4) array
+    """
+    return np.diag([1j, 1, 1, 1j])
+
+
+def single_qubit_gate(theta, phi, phi_z):
+    """ Single Qubit Gate Decomposition
+
+    Rz(phi_z) * Rxy(theta, phi)
+
+    Returns:
+        (..., 2, 2) array
+    """
+    return np.matmul(rotation_z(phi_z), rotation_xy(theta, phi))
+
+
+def v_gate(alpha, beta, delta):
+    """ Entangling Core of the Two Qubit Decomposition
+
+    Returns:
+        (..., 4, 4) array
+    """
+    alpha, beta, delta = np.broadcast_arrays(alpha, beta, delta)
+    entangle = entangle_gate()
+    quarter = np.full(alpha.shape, 3 * np.pi / 2)
+
+    op1 = kron(rotation_xy(beta, np.pi / 2), rotation_xy(quarter, delta))
+    op2 = kron(rotation_xy(alpha, 0), rotation_xy(quarter, 0))
+
+    return np.matmul(entangle, np.matmul(op1, np.matmul(entangle, op2)))
+
+
+def two_qubit_gate(params):
+    """ Two Qubit Gate Decomposition
+
+    U = (C tensor D) V (A tensor B) from 15 angles, ordered as in
+    Circuit.unitary
+
+    Args:
+        params: (15,) or (N, 15) array of angles
+
+    Returns:
+        (4, 4) or (N, 4, 4) array
+    """
+    params = np.asarray(params, dtype=float)
+    angles = np.moveaxis(params, -1, 0)
+
+    rotation_1 = kron(single_qubit_gate(*angles[0:3]),
+                      single_qubit_gate(*angles[3:6]))
+    rotation_2 = kron(single_qubit_gate(*angles[9:12]),
+                      single_qubit_gate(*angles[12:15]))
+    v_unitary = v_gate(*angles[6:9])
+
+    return np.matmul(rotation_2, np.matmul(v_unitary, rotation_1))
+
+
+def rotation_xy_grad(theta, phi):
+    """ Derivatives of the XY Rotation Matrix
+
+    Returns:
+        (2, ..., 2, 2) array holding d/dtheta and d/dphi
+    """
+    theta, phi = np.broadcast_arrays(np.asarray(theta, dtype=float),
+                                     np.asarray(phi, dtype=float))
+    cos = np.cos(theta / 2)
+    sin = -1j * np.sin(theta / 2)
+
+    grad = np.zeros((2,) + theta.shape + (2, 2), dtype=complex)
+    grad[0, ..., 0, 0] = -np.sin(theta / 2) / 2
+    grad[0, ..., 0, 1] = -0.5j * cos * np.exp(-1j * phi)
+    grad[0, ..., 1, 0] = -0.5j * cos * np.exp(1j * phi)
+    grad[0, ..., 1, 1] = -np.sin(theta / 2) / 2
+    grad[1, ..., 0, 1] = -1j * sin * np.exp(-1j * phi)
+    grad[1, ..., 1, 0] = 1j * sin * np.exp(1j * phi)
+
+    return grad
+
+
+def rotation_z_grad(phi):
+    """ Derivative of the Z Rotation Matrix
+
+    Returns:
+        (..., 2, 2) array holding d/dphi
+    """
+    phi = np.asarray(phi, dtype=float)
+
+    grad = np.zeros(phi.shape + (2, 2), dtype=complex)
+    grad[..., 0, 0] = -0.5j * np.exp(-0.5j * phi)
+    grad[..., 1, 1] = 0.5j * np.exp(0.5j * phi)
+
+    return grad
+
+
+def single_qubit_gate_grad(theta, phi, phi_z):
+    """ Derivatives of the Single Qubit Gate
+
+    Returns:
+        (3, ..., 2, 2) array holding d/dtheta, d/dphi and d/dphi_z
+    """
+    rotate_z = rotation_z(phi_z)
+    rotate_xy = rotation_xy(theta, phi)
+    d_theta, d_phi = rotation_xy_grad(theta, phi)
+    d_phi_z = np.matmul(rotation_z_grad(phi_z), rotate_xy)
+
+    return np.stack(np.broadcast_arrays(np.matmul(rotate_z, d_theta),
+                                        np.matmul(rotate_z, d_phi), d_phi_z))
+
+
+def v_gate_grad(alpha, beta, delta):
+    """ Derivatives of the V Gate
+
+    Returns:
+        (3, ..., 4, 4) array holding d/dalpha, d/dbeta and d/ddelta
+    """
+    alpha, beta, delta = np.broadcast_arrays(alpha, beta, delta)
+    entangle = entangle_gate()
+    quarter = np.full(alpha.shape, 3 * np.pi / 2)
+
+    beta_xy = rotation_xy(beta, np.pi / 2)
+    delta_xy = rotation_xy(quarter, delta)
+    op1 = kron(beta_xy, delta_xy)
+    op2 = kron(rotation_xy(alpha, 0), rotation_xy(quarter, 0))
+
+    d_op1_beta = kron(rotation_xy_grad(beta, np.pi / 2)[0], delta_xy)
+    d_op1_delta = kron(beta_xy, rotation_xy_grad(quarter, delta)[1])
+    d_op2_alpha = kron(rotation_xy_grad(alpha, 0)[0],
+                       rotation_xy(quarter, 0))
+
+    def sandwich(left, right):
+        return np.matmul(entangle, np.matmul(left, np.matmul(entangle, right)))
+
+    return np.stack([sandwich(op1, d_op2_alpha),
+                     sandwich(d_op1_beta, op2),
+                     sandwich(d_op1_delta, op2)])
+
+
+def two_qubit_gate_grad(params):
+    """ Derivatives of the Two Qubit Gate Decomposition
+
+    Args:
+        params: (15,) or (N, 15) array of angles
+
+    Returns:
+        (15, 4, 4) or (15, N, 4, 4) array, one derivative per angle
+    """
+    params = np.asarray(params, dtype=float)
+    angles = np.moveaxis(params, -1, 0)
+
+    gate_a = single_qubit_gate(*angles[0:3])
+    gate_b = single_qubit_gate(*angles[3:6])
+    gate_c = single_qubit_gate(*angles[9:12])
+    gate_d = single_qubit_gate(*angles[12:15])
+
+    rotation_1 = kron(gate_a, gate_b)
+    rotation_2 = kron(gate_c, gate_d)
+    v_unitary = v_gate(*angles[6:9])
+
+    d_rotation_1 = np.concatenate(
+        [kron(single_qubit_gate_grad(*angles[0:3]), gate_b),
+         kron(gate_a, single_qubit_gate_grad(*angles[3:6]))])
+    d_rotation_2 = np.concatenate(
+        [kron(single_qubit_gate_grad(*angles[9:12]), gate_d),
+         kron(gate_c, single_qubit_gate_grad(*angles[12:15]))])
+
+    return np.concatenate(
+        [np.matmul(rotation_2, np.matmul(v_unitary, d_rotation_1[:6])),
+         np.matmul(rotation_2, np.matmul(v_gate_grad(*angles[6:9]),
+                                         rotation_1)),
+         np.matmul(d_rotation_2, np.matmul(v_unitary, rotation_1))])
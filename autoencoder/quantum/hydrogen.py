@@ -1,10 +1,107 @@
-from qutip import tensor, sigmax, sigmay, sigmaz, qeye, basis
-from PyQuante.Molecule import Molecule
-from PyQuante.hartree_fock import rhf
-from basis_sto6g import basis_data
-from numpy import linspace
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+import os
+
+from numpy import array, asarray, einsum, linspace, load, ndindex, savez
 from random import sample
 
+from pauli import PauliSum
+
+
+BASIS = 'sto-6g'
+
+# reference internuclear distance, and the grid of the dataset which starts
+# just above 0 as coincident nuclei have no Hartree-Fock solution
+REFERENCE_DIST = 1.4
+INTERNUC_DIST = linspace(0, 3, 51)[1:]
+
+# JW mapped hamiltonian acting on qubits, as (coefficient, sign, pauli string)
+H2_TERMS = [
+    (0, 1, 'IIII'),
+    (1, 1, 'ZIII'), (1, 1, 'IZII'),
+    (2, 1, 'IIZI'), (2, 1, 'IIIZ'),
+    (3, 1, 'ZZII'),
+    (4, 1, 'ZIZI'), (4, 1, 'IZIZ'),
+    (5, 1, 'IZZI'), (5, 1, 'ZIIZ'),
+    (6, 1, 'IIZZ'),
+    (7, 1, 'YXXY'), (7, -1, 'XXYY'), (7, -1, 'YYXX'), (7, 1, 'XYYX'),
+]
+H2_HAMILTONIAN = PauliSum(H2_TERMS)
+
+RHF_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'rhf_cache')
+
+# part of the cache key, so files written before the cache held the
+# Hamiltonian coefficients are never loaded
+CACHE_VERSION = 2
+
+
+def h2_geometry(r):
+    """ Atoms of Molecular Hydrogen along the x axis
+    """
+    return [(1, (0, 0, 0)), (1, (r, 0, 0))]
+
+
+def h2_coefficients(h_mo, eri_mo, nuclear):
+    """ Coefficients of H2_TERMS from the Molecular Orbital Integrals
+
+    Spin orbitals 0 and 1 are the bonding orbital g with spin up and down,
+    2 and 3 the antibonding orbital u, so the Hartree Fock state is |1100>.
+
+    Args:
+        h_mo: (2, 2) one electron integrals over the g and u orbitals
+        eri_mo: (2, 2, 2, 2) two electron integrals (pq|rs), chemists'
+            notation
+        nuclear: nuclear repulsion energy
+
+    Returns:
+        (8,) array of coefficients
+    """
+    h_gg, h_uu = h_mo[0][0], h_mo[1][1]
+    j_gg, j_uu = eri_mo[0][0][0][0], eri_mo[1][1][1][1]
+    j_gu, k_gu = eri_mo[0][0][1][1], eri_mo[0][1][1][0]
+
+    return array([
+        nuclear + h_gg + h_uu + (j_gg + j_uu + 4 * j_gu - 2 * k_gu) / 4,
+        -h_gg / 2 - (j_gg + 2 * j_gu - k_gu) / 4,
+        -h_uu / 2 - (j_uu + 2 * j_gu - k_gu) / 4,
+        j_gg / 4,
+        (j_gu - k_gu) / 4,
+        j_gu / 4,
+        j_uu / 4,
+        k_gu / 4,
+    ])
+
+
+def rhf_coefficients(r):
+    """ Restricted Hartree Fock at one Internuclear Distance
+
+    Module level so the sweep can be sent to worker processes. PyQuante is
+    only imported here, by the processes that actually run the sweep.
+
+    Returns:
+        Hartree Fock energy and (8,) array of the coefficients of H2_TERMS
+    """
+    from PyQuante.Ints import getbasis, getints, ijkl2intindex
+    from PyQuante.Molecule import Molecule
+    from PyQuante.hartree_fock import rhf
+    from basis_sto6g import basis_data
+
+    h2 = Molecule('h2', h2_geometry(r))
+    bfs = getbasis(h2, basis_data)  # using stog_6g basis data
+    S, h, Ints = getints(bfs, h2)
+    en, orbe, orbs = rhf(h2, bfs=bfs, integrals=(S, h, Ints))
+
+    # atomic to molecular orbital integrals, orbitals are the columns
+    n = len(bfs)
+    eri = array([Ints[ijkl2intindex(*index)] for index in
+                 ndindex(n, n, n, n)]).reshape(n, n, n, n)
+    orbs = asarray(orbs)
+    h_mo = einsum('pi,pq,qj->ij', orbs, asarray(h), orbs)
+    eri_mo = einsum('pi,qj,pqrs,rk,sl->ijkl', orbs, orbs, eri, orbs, orbs)
+
+    return en, h2_coefficients(h_mo, eri_mo, h2.get_enuke())
+
 
 class Hydrogen():
     """State Preparation for Molecular Hydrogen Wavefunction
@@ -17,12 +114,39 @@ class Hydrogen():
     Attributes:
         train_set: The training set of Qobjs for molecular hydrogen
         test_set: The testing set of Qobjs for molecular hydrogen
+        train_states: The training set stacked as a (B, 16) array, as used
+            by Circuit.batch_fidelity
+        cache_dir: directory of the Hartree Fock cache, None disables it
+        processes: size of the process pool running the Hartree Fock sweep
     """
 
-    def __init__(self):
+    def __init__(self, cache_dir=RHF_CACHE, processes=None, prepare=True):
         """ Initialize Hydrogen
+
+        Args:
+            cache_dir: directory of the Hartree Fock cache, None disables it
+            processes: size of the process pool, all cores when None
+            prepare: whether to prepare the train and test sets now, without
+                it only the get_* methods are available
+        """
+        self.cache_dir = cache_dir
+        self.processes = processes
+
+        if prepare:
+            self.train_set, self.test_set = self.get_input_states()
+            self.train_states = self.stack_states(self.train_set)
+
+    @staticmethod
+    def stack_states(states):
+        """ Stack Qobj States into an Array
+
+        Args:
+            states: A list of 4 qubit Qobj kets
+
+        Returns:
+            (B, 16) array with one flattened state per row
         """
-        self.train_set, self.test_set = self.get_input_states()
+        return array([state.full().ravel() for state in states])
 
     def get_input_states(self):
         """ Retrieve Input Qubit States
@@ -34,76 +158,146 @@ class Hydrogen():
             Training and testing datasets of qubits in the ground state of
             molecular hydrogen
         """
-        coeff_dict = self.get_rhf_coeffs()
-        train_r = sample(range(0, 50), 6)
+        from qutip import Qobj as Q
+
+        internuc_dist, states = self.get_distance_states()
+        train_r = sample(range(0, len(internuc_dist)), 6)
         train_set, test_set = [], []
 
-        #
-        for coeff in coeff_dict:
-            input_state = self.get_qubits(coeff)
+        for index, state in enumerate(states):
+            input_state = Q(state.reshape(-1, 1), dims=[[2] * 4, [1] * 4])
 
-            if coeff in train_r:
+            if index in train_r:
                 train_set.append(input_state)
             else:
                 test_set.append(input_state)
 
         return train_set, test_set
 
+    def get_distance_states(self, internuc_dist=INTERNUC_DIST):
+        """ Ground States along the Internuclear Distance Grid
+
+        Args:
+            internuc_dist: array of internuclear distances
+
+        Returns:
+            array of R increasing distances and (R, 16) array of the ground
+            state at each, as used by Autoencoder.sweep
+        """
+        coeff_dict = self.get_rhf_coeffs(internuc_dist)
+        internuc_dist = sorted(coeff_dict)
+
+        # every distance in one batched diagonalization
+        states = self.get_ground_states([coeff_dict[r] for r in internuc_dist])
+
+        return array(internuc_dist), states
+
+    @staticmethod
+    def get_ground_states(coeffs):
+        """ Ground States of the JW Mapped Hamiltonian
+
+        Args:
+            coeffs: (R, 8) array, one set of coefficients per distance, see
+                h2_coefficients
+
+        Returns:
+            (R, 16) array of ground states
+
+        Raises:
+            Exception: An error if coeffs is not an (R, 8) array
+        """
+        coeffs = asarray(coeffs, dtype=float)
+        if coeffs.ndim != 2 or coeffs.shape[1] != len(H2_HAMILTONIAN.mixing):
+            raise Exception('Coefficients must be an (R, %d) array, not %s' %
+                            (len(H2_HAMILTONIAN.mixing), coeffs.shape))
+
+        energies, states = H2_HAMILTONIAN.ground_states(coeffs)
+
+        return states
+
     def get_qubits(self, coeff):
         """ Retrieve Qubits using JW transformation
 
         Args:
-            coeff: A list of integers of integrals from restricted hartree_fock
+            coeff: (8,) array of coefficients from restricted hartree_fock
 
         Returns:
             Mapped qubit input state from molecular hydrogen hamiltonian
         """
-        iden = qeye(2)
-
-        # define hamiltonian acting on qubits
-        term0 = coeff[0] * tensor(iden, iden, iden, iden)
-        term1 = coeff[1] * (tensor(sigmaz(), iden, iden, iden) +
-                            tensor(iden, sigmaz(), iden, iden))
-        term2 = coeff[2] * (tensor(iden, iden, sigmaz(), iden) +
-                            tensor(iden, iden, iden, sigmaz()))
-        term3 = coeff[3] * (tensor(sigmaz(), sigmaz(), iden, iden))
-        term4 = coeff[4] * (tensor(sigmaz(), iden, sigmaz(), iden) +
-                            tensor(iden, sigmaz(), iden, sigmaz()))
-        term5 = coeff[5] * (tensor(iden, sigmaz(), sigmaz(), iden) +
-                            tensor(sigmaz(), iden, sigmaz(), iden))
-        term6 = coeff[6] * (tensor(iden, iden, sigmaz(), sigmaz(), iden))
-        term7 = coeff[7] * (tensor(sigmay(), sigmax(), sigmax(), sigmay()) -
-                            tensor(sigmax(), sigmax(), sigmay(), sigmay()) -
-                            tensor(sigmay(), sigmay(), sigmax(), sigmax()) +
-                            tensor(sigmax(), sigmay(), sigmay(), sigmax()))
-
-        hamilt = term0 + term1 + term2 + term3 + term4 + term5 + term6 + term7
-
-        return hamilt * basis(4, 0)
-
-    def get_rhf_coeffs(self):
+        from qutip import Qobj as Q
+
+        state = self.get_ground_states([coeff])[0]
+
+        return Q(state.reshape(-1, 1), dims=[[2] * 4, [1] * 4])
+
+    def get_rhf_coeffs(self, internuc_dist=INTERNUC_DIST):
         """ Use PyQuante to Calculate Restricted Hartree Fock
 
+        The sweep over internuclear distances runs on a process pool and is
+        saved to an .npz file in cache_dir, keyed by the geometry, basis set
+        and distance grid, so later runs load it instead of recomputing.
+
         Args:
-            None
+            internuc_dist: array of internuclear distances
 
         Returns:
-            A dictionary containing the coefficient and energies of moelecular
-            hydrogen based on increasing internuclear distance
+            A dictionary from each internuclear distance to the (8,) array
+            of Hamiltonian coefficients of molecular hydrogen there
         """
-        # test PyQuante
-        h2 = Molecule('h2', [(1, (0, 0, 0)), (1, (1.4, 0, 0))])
-        en, orbe, orbs = rhf(h2, basis_data)  # using stog_6g basis data
+        path = self.get_cache_path(internuc_dist)
 
-        print("HE Energy = ", en)
+        if path is not None and os.path.exists(path):
+            cached = load(path)
+            ref_energy = float(cached['reference'])
+            coeffs = list(cached['coefficients'])
+        else:
+            # the reference molecule runs alongside the sweep
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                results = list(pool.map(rhf_coefficients, [REFERENCE_DIST] +
+                                        [float(r) for r in internuc_dist]))
+            ref_energy = results.pop(0)[0]
+            energies = [en for en, coeff in results]
+            coeffs = [coeff for en, coeff in results]
 
-        # internuclear distance
-        internuc_dist = linspace(0, 3, 50)
-        dataset = {}
+            if path is not None:
+                self.save_cache(path, internuc_dist, energies, coeffs,
+                                ref_energy)
 
-        for r in internuc_dist:
-            h2 = Molecule('h2', [(1, (0, 0, 0)), (1, (1.4, 0, 0))])
-            en, orbe, orbs = rhf(h2, basis_data)  # using stog_6g basis data
-            dataset[r] = en
+        print("HE Energy = ", ref_energy)
+
+        return dict(zip(internuc_dist, coeffs))
+
+    def get_cache_path(self, internuc_dist):
+        """ Cache File of a Hartree Fock Sweep
+
+        Args:
+            internuc_dist: array of internuclear distances
+
+        Returns:
+            path of the .npz file, or None when caching is disabled
+        """
+        if self.cache_dir is None:
+            return None
+
+        key = repr((CACHE_VERSION, h2_geometry('r'), BASIS, REFERENCE_DIST,
+                    [round(float(r), 12) for r in internuc_dist]))
+
+        return os.path.join(self.cache_dir, 'rhf_%s.npz' %
+                            sha1(key.encode()).hexdigest()[:16])
+
+    @staticmethod
+    def save_cache(path, internuc_dist, energies, coeffs, ref_energy):
+        """ Write a Hartree Fock Sweep to the Cache
+
+        The file is written under a temporary name and moved into place, so
+        concurrent runs never load a partial file.
+        """
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
 
-        return dataset
+        partial = '%s.%d.tmp' % (path, os.getpid())
+        with open(partial, 'wb') as handle:
+            savez(handle, distances=internuc_dist, energies=energies,
+                  coefficients=coeffs, reference=ref_energy)
+        os.replace(partial, path)
@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+import json
+import time
+
+
+class Instrument():
+    """Stage Timers, Counters and Trace of a Training Run
+
+    Circuit and Autoencoder report to an Instrument: time spent in each stage
+    (unit cell build, evolution, fidelity, gradient, optimizer step), counts
+    of cost and gradient evaluations and of basin-hopping hops, and events
+    such as each hop or outer iteration. Events are passed to the callbacks
+    and, when a trace path is set, appended to it as JSON lines.
+
+    Attributes:
+        trace_path: optional JSON lines file receiving every event
+        callbacks: callables receiving each event as a dictionary
+        timers: dictionary of stage name to [seconds, calls]
+        counters: dictionary of counter name to count
+    """
+
+    def __init__(self, trace_path=None, callbacks=()):
+        """ Init Instrument
+
+        Args:
+            trace_path: optional JSON lines file receiving every event
+            callbacks: callables receiving each event as a dictionary
+        """
+        self.trace_path = trace_path
+        self.callbacks = list(callbacks)
+        self.timers = {}
+        self.counters = {}
+        self.laps = {}
+
+    @contextmanager
+    def stage(self, name):
+        """ Time a Stage
+
+        Args:
+            name: stage name, time and calls accumulate across uses
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        """ Add Time to a Stage
+        """
+        timer = self.timers.setdefault(name, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += 1
+
+    def start_lap(self, name):
+        """ Start Timing a Stage measured between Events
+        """
+        self.laps[name] = time.perf_counter()
+
+    def lap(self, name):
+        """ Close the Current Lap of a Stage and Start the Next one
+        """
+        now = time.perf_counter()
+        self.add_time(name, now - self.laps.get(name, now))
+        self.laps[name] = now
+
+    def count(self, name, number=1):
+        """ Increment a Counter
+        """
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def emit(self, event, **fields):
+        """ Record an Event
+
+        Args:
+            event: event name, e.g. 'hop' or 'iteration'
+            fields: JSON serializable values, numpy values are converted
+        """
+        record = dict(fields, event=event, time=time.time())
+
+        for callback in self.callbacks:
+            callback(record)
+
+        if self.trace_path is not None:
+            with open(self.trace_path, 'a') as trace:
+                trace.write(json.dumps(record, default=self.to_json) + '\n')
+
+    @staticmethod
+    def to_json(value):
+        """ Convert numpy Values for JSON
+        """
+        if hasattr(value, 'tolist'):
+            return value.tolist()
+
+        return str(value)
+
+    def summary(self):
+        """ Timers and Counters
+
+        Returns:
+            dictionary with the seconds and calls of each stage and the
+            counters
+        """
+        return {'timers': dict((name, {'seconds': seconds, 'calls': calls})
+                               for name, (seconds, calls)
+                               in self.timers.items()),
+                'counters': dict(self.counters)}
+
+    def reset(self):
+        """ Clear Timers and Counters
+        """
+        self.timers.clear()
+        self.counters.clear()
+        self.laps.clear()
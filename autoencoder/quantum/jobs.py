@@ -0,0 +1,291 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+from random import seed as random_seed
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from autoencoder import N_PARAMS, Autoencoder
+from circuit import Circuit
+from hydrogen import RHF_CACHE, Hydrogen
+
+
+# settings of the optimizer entry of a job spec
+OPTIMIZER_DEFAULTS = {'name': 'basinhopping', 'n_iter': 500,
+                      'step_size': 10 ** (-8), 'shots': None,
+                      'precision': 'double', 'options': {}}
+
+COLUMNS = ('job', 'model', 'num_ref', 'seed', 'distance', 'optimizer',
+           'fidelity', 'cost_evals', 'seconds', 'params')
+
+
+def run_task(task):
+    """ Train one Model of a Job
+
+    Module level so it can be sent to worker processes, which only import
+    numpy and the statevector simulator until an optimizer needs scipy.
+
+    Args:
+        task: dictionary with the job name, model, num_ref, seed, distance,
+            (B, 16) array of training states and optimizer settings
+
+    Returns:
+        dictionary of the COLUMNS, params as an array
+    """
+    from optimizers import OPTIMIZERS
+
+    settings = task['optimizer']
+    model, seed = task['model'], task['seed']
+
+    random_seed(seed)
+    encoder = Autoencoder(task['states'], num_ref=task['num_ref'],
+                          precision=settings['precision'])
+    circuit = encoder.get_circuit(model)
+    n_params = N_PARAMS[model]
+
+    optimizer = None
+    if settings['name'] != 'basinhopping':
+        optimizer = OPTIMIZERS[settings['name']](**settings['options'])
+
+    start = time.perf_counter()
+    res = encoder.optimize(circuit, model, encoder.get_params(n_params),
+                           encoder.get_bounds(n_params),
+                           n_iter=settings['n_iter'],
+                           step_size=settings['step_size'], seed=seed,
+                           shots=settings['shots'], optimizer=optimizer)
+    seconds = time.perf_counter() - start
+
+    return {'job': task['job'], 'model': model, 'num_ref': task['num_ref'],
+            'seed': seed, 'distance': task['distance'],
+            'optimizer': settings['name'],
+            'fidelity': circuit.batch_fidelity(model, res.x, task['states']),
+            'cost_evals': encoder.instrument.counters.get('cost_evals', 0),
+            'seconds': seconds, 'params': np.asarray(res.x, dtype=float)}
+
+
+class ResultStore():
+    """Results of the Batch Jobs in one SQLite File
+
+    One row per trained model, with the parameters stored as raw float64
+    bytes, so many jobs can share the file and be queried without loading
+    every result.
+
+    Attributes:
+        path: SQLite file
+    """
+
+    def __init__(self, path):
+        """ Init ResultStore, creating the table if needed
+        """
+        self.path = path
+
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (job TEXT, model TEXT, '
+                'num_ref INTEGER, seed INTEGER, distance REAL, '
+                'optimizer TEXT, fidelity REAL, cost_evals INTEGER, '
+                'seconds REAL, params BLOB)')
+
+    def connect(self):
+        """ Connection to the Store
+        """
+        return sqlite3.connect(self.path)
+
+    def add(self, result):
+        """ Insert one Result of run_task
+        """
+        row = dict(result, params=np.asarray(result['params'],
+                                             dtype='<f8').tobytes())
+
+        with closing(self.connect()) as connection, connection:
+            connection.execute('INSERT INTO results VALUES (%s)' %
+                               ', '.join('?' * len(COLUMNS)),
+                               [row[column] for column in COLUMNS])
+
+    def results(self, job=None):
+        """ Stored Results, optionally of one Job
+
+        Returns:
+            list of dictionaries of the COLUMNS, params as an array
+        """
+        query = 'SELECT %s FROM results' % ', '.join(COLUMNS)
+        args = ()
+        if job is not None:
+            query += ' WHERE job = ?'
+            args = (job,)
+
+        with closing(self.connect()) as connection, connection:
+            rows = connection.execute(query, args).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(zip(COLUMNS, row))
+            result['params'] = np.frombuffer(result['params'], dtype='<f8')
+            results.append(result)
+
+        return results
+
+
+class Job():
+    """Batch of Autoencoder Trainings from a JSON Spec
+
+    The spec lists the models, num_ref values and seeds, every combination
+    being one task, and the optimizer settings shared by all of them. With
+    distances each task trains on the ground state at one internuclear
+    distance, otherwise on the Hydrogen training set, or on the (B, 16)
+    states of a .npy file given as states. The states are prepared once in
+    this process, so the workers never import PyQuante or qutip.
+
+    Attributes:
+        name: job name recorded with every result
+        models: models to train
+        num_ref: numbers of reference qubits
+        seeds: seeds of the initial parameters and optimizers
+        distances: optional internuclear distances
+        states: optional .npy file of training states
+        cache_dir: directory of the Hartree Fock cache
+        optimizer: optimizer settings, see OPTIMIZER_DEFAULTS
+        processes: size of the process pool, 1 runs in this process
+    """
+
+    def __init__(self, spec, name=None):
+        """ Init Job
+
+        Args:
+            spec: dictionary of the job spec
+            name: job name, spec['name'] by default
+
+        Raises:
+            Exception: An error if the spec has unknown keys, models,
+                optimizer, or num_ref or precision the circuits reject
+        """
+        from optimizers import OPTIMIZERS
+
+        keys = {'name', 'models', 'num_ref', 'seeds', 'distances', 'states',
+                'cache_dir', 'optimizer', 'processes'}
+        if not set(spec) <= keys:
+            raise Exception('Unknown job spec keys %s' %
+                            ', '.join(sorted(set(spec) - keys)))
+
+        self.name = spec.get('name', 'job') if name is None else name
+        self.models = list(spec.get('models', ['a', 'b']))
+        self.num_ref = list(spec.get('num_ref', [2]))
+        self.seeds = list(spec.get('seeds', [0]))
+        self.distances = spec.get('distances')
+        self.states = spec.get('states')
+        self.cache_dir = spec.get('cache_dir', RHF_CACHE)
+        self.processes = spec.get('processes', 1)
+
+        self.optimizer = dict(OPTIMIZER_DEFAULTS, **spec.get('optimizer', {}))
+
+        if not set(self.models) <= set(N_PARAMS):
+            raise Exception('Models must be among %s' %
+                            ', '.join(sorted(N_PARAMS)))
+        if self.optimizer['name'] not in ['basinhopping'] + list(OPTIMIZERS):
+            raise Exception('Optimizer must be basinhopping or one of %s' %
+                            ', '.join(sorted(OPTIMIZERS)))
+
+        # the circuits' own checks, before any task runs
+        for num_ref in self.num_ref:
+            Circuit(num_ref, None, method='analytic',
+                    precision=self.optimizer['precision'])
+
+    @classmethod
+    def load(cls, path):
+        """ Job from a JSON Spec File, named after the file by default
+        """
+        with open(path) as handle:
+            spec = json.load(handle)
+
+        name = spec.get('name', os.path.splitext(os.path.basename(path))[0])
+
+        return cls(spec, name)
+
+    def training_sets(self):
+        """ Training States of each Distance
+
+        Returns:
+            list of (distance, (B, 16) array) pairs, distance None for the
+            whole training set
+        """
+        if self.states is not None:
+            return [(None, np.load(self.states))]
+
+        if self.distances is None:
+            return [(None, Hydrogen(self.cache_dir).train_states)]
+
+        hydrogen = Hydrogen(self.cache_dir, prepare=False)
+        internuc_dist, states = hydrogen.get_distance_states(
+            np.array(self.distances, dtype=float))
+
+        return [(float(r), state[None]) for r, state in
+                zip(internuc_dist, states)]
+
+    def tasks(self):
+        """ Every Task of the Job, for run_task
+        """
+        return [{'job': self.name, 'model': model, 'num_ref': num_ref,
+                 'seed': seed, 'distance': distance, 'states': states,
+                 'optimizer': self.optimizer}
+                for distance, states in self.training_sets()
+                for model in self.models for num_ref in self.num_ref
+                for seed in self.seeds]
+
+    def run(self, store=None, callback=None):
+        """ Run the Tasks, Storing each Result as it Finishes
+
+        Args:
+            store: optional ResultStore
+            callback: optional callback(result) run as each result
+                finishes, e.g. to report progress
+
+        Returns:
+            list of results, in completion order
+        """
+        tasks = self.tasks()
+        results = []
+
+        def finish(result):
+            if store is not None:
+                store.add(result)
+            results.append(result)
+            if callback is not None:
+                callback(result)
+
+        if self.processes == 1:
+            for task in tasks:
+                finish(run_task(task))
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                futures = [pool.submit(run_task, task) for task in tasks]
+                for future in as_completed(futures):
+                    finish(future.result())
+
+        return results
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Run a batch of autoencoder '
+                                        'trainings from a JSON job spec')
+    parser.add_argument('spec')
+    parser.add_argument('--store', default='results.sqlite')
+    parser.add_argument('--name', default=None)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    job = Job.load(args.spec)
+    if args.name is not None:
+        job.name = args.name
+    if args.processes is not None:
+        job.processes = args.processes
+
+    def report(result):
+        print(result['model'], result['num_ref'], result['seed'],
+              result['distance'], result['fidelity'], result['seconds'])
+
+    job.run(ResultStore(args.store), report)
@@ -0,0 +1,132 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+from random import seed as random_seed
+import time
+
+from autoencoder import N_PARAMS, Autoencoder
+
+
+def run_start(model, seed, train_states, n_iter, step_size, target=None,
+              stop=None):
+    """ Run one Seeded Basin-Hopping Start
+
+    Module level so it can be sent to worker processes.
+
+    Args:
+        model: A string indicating which model to use
+        seed: An integer seeding the initial parameters and the random hops
+        train_states: (B, 16) array of training states
+        n_iter: An integer number of basin-hopping iterations
+        step_size: width of each random hop
+        target: optional fidelity at which this start and the others stop
+        stop: optional shared Event, set once any start reaches target
+
+    Returns:
+        dictionary with the model, seed, optimized params, fidelity, trace of
+        (fidelity, accepted) for the initial minimization and each hop,
+        wall-clock time and whether it was stopped early
+    """
+    random_seed(seed)
+    encoder = Autoencoder(train_states)
+    circuit = encoder.get_circuit(model)
+    n_params = N_PARAMS[model]
+    trace = []
+
+    def callback(params, cost, accept):
+        trace.append((1 - cost, bool(accept)))
+
+        if target is not None and 1 - cost >= target and stop is not None:
+            stop.set()
+
+        return stop is not None and stop.is_set()
+
+    start = time.time()
+    res = encoder.optimize(circuit, model, encoder.get_params(n_params),
+                           encoder.get_bounds(n_params), n_iter=n_iter,
+                           step_size=step_size, callback=callback, seed=seed)
+
+    return {'model': model, 'seed': seed, 'params': res.x,
+            'fidelity': 1 - res.fun, 'trace': trace,
+            'time': time.time() - start, 'stopped': len(trace) <= n_iter}
+
+
+class MultiStart():
+    """Parallel Multi-Start Basin-Hopping
+
+    The optimum found by a single basin-hopping run depends heavily on its
+    random start, so this runs independent seeded starts of model 'a' and/or
+    'b' across a process pool and keeps the best one. With a target fidelity
+    the pool is cancelled as soon as one start reaches it: queued starts are
+    dropped and running ones stop after their current hop.
+
+    Attributes:
+        train_states: (B, 16) array of training states sent to every start
+        n_starts: number of seeded starts per model
+        processes: size of the process pool, all cores when None
+        n_iter: basin-hopping iterations per start
+        step_size: width of each random hop
+        target: optional fidelity to stop at
+    """
+
+    def __init__(self, train_states, n_starts=8, processes=None, n_iter=500,
+                 step_size=(10 ** (-8)), target=None):
+        """ Init MultiStart
+        """
+        self.train_states = train_states
+        self.n_starts = n_starts
+        self.processes = processes
+        self.n_iter = n_iter
+        self.step_size = step_size
+        self.target = target
+
+    def run(self, models=('a', 'b'), seeds=None):
+        """ Run all Starts
+
+        Args:
+            models: models to train
+            seeds: list of seeds, range(n_starts) when None
+
+        Returns:
+            dictionary per model with the best start, all finished starts
+            sorted by seed and the wall-clock time
+        """
+        seeds = list(range(self.n_starts)) if seeds is None else list(seeds)
+        results = {}
+
+        with Manager() as manager, \
+                ProcessPoolExecutor(max_workers=self.processes) as pool:
+            for model in models:
+                stop = manager.Event()
+                start = time.time()
+
+                futures = [pool.submit(run_start, model, seed,
+                                       self.train_states, self.n_iter,
+                                       self.step_size, self.target, stop)
+                           for seed in seeds]
+
+                starts = []
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+
+                    starts.append(future.result())
+
+                    if stop.is_set():
+                        for pending in futures:
+                            pending.cancel()
+
+                starts.sort(key=lambda result: result['seed'])
+                results[model] = {
+                    'best': max(starts, key=lambda result: result['fidelity']),
+                    'starts': starts,
+                    'time': time.time() - start}
+
+        return results
+
+
+if __name__ == '__main__':
+
+    runner = MultiStart(Autoencoder().train_states)
+
+    for model, result in runner.run().items():
+        print(model, result['best']['fidelity'], result['best']['params'])
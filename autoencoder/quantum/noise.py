@@ -0,0 +1,226 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from statevector import StateVector
+
+
+PAULIS = np.array([[[1, 0], [0, 1]], [[0, 1], [1, 0]],
+                   [[0, -1j], [1j, 0]], [[1, 0], [0, -1]]], dtype=complex)
+
+HADAMARD = np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2)
+
+# controlled swap, control qubit first, |101> <-> |110>
+FREDKIN = np.eye(8, dtype=complex)[[0, 1, 2, 3, 4, 6, 5, 7]]
+
+
+class NoiseModel():
+    """Single Qubit Noise after every Gate
+
+    Each qubit a gate touches then goes through a depolarizing channel and
+    an amplitude damping channel. Both are unravelled into quantum
+    trajectories: every state of the batch draws one Kraus operator per
+    channel, so the batch stays a (T, 2^n) array of pure states and the
+    average over trajectories reproduces the density matrix.
+
+    Attributes:
+        depolarizing: probability of an X, Y or Z error
+        damping: probability of decay from |1> to |0>
+    """
+
+    def __init__(self, depolarizing=0.0, damping=0.0):
+        """ Init NoiseModel
+        """
+        self.depolarizing = depolarizing
+        self.damping = damping
+
+    def apply(self, register, axes, rng):
+        """ Apply the Channels to Tensor Axes of every Trajectory
+
+        Args:
+            register: StateVector, one trajectory per batch entry
+            axes: tensor axes of the qubits the last gate touched
+            rng: numpy RandomState drawing the Kraus operators
+        """
+        count = len(register.tensor)
+
+        for axis in axes:
+            if self.depolarizing > 0:
+                errors = rng.choice(4, size=count, p=[
+                    1 - self.depolarizing] + [self.depolarizing / 3] * 3)
+                register.contract_paired(PAULIS[errors], [axis])
+
+            if self.damping > 0:
+                excited = np.take(register.tensor, 1, axis=axis)
+                population = np.sum(np.abs(excited.reshape(count, -1)) ** 2,
+                                    axis=1)
+                decay = rng.uniform(size=count) < self.damping * population
+
+                kraus = np.zeros((count, 2, 2), dtype=complex)
+                kraus[decay, 0, 1] = np.sqrt(self.damping)
+                kraus[~decay, 0, 0] = 1
+                kraus[~decay, 1, 1] = np.sqrt(1 - self.damping)
+                register.contract_paired(kraus, [axis])
+
+                norms = np.linalg.norm(register.tensor.reshape(count, -1),
+                                       axis=1)
+                register.tensor /= norms.reshape((count,) + (1,) *
+                                                 (register.tensor.ndim - 1))
+
+
+def run_trajectories(template, trash, params, states, noise, n_traj, seed):
+    """ Swap Test Probabilities of a Batch of Noisy Trajectories
+
+    Module level so it can be sent to worker processes. The register holds
+    the swap test ancilla, then the references, then the input qubits, as
+    in Circuit.swap_test_overlap.
+
+    Args:
+        template: Template of the model
+        trash: indices of the trash qubits
+        params: array of rotations required for gate operations
+        states: (B, 2^n) array of input states
+        noise: NoiseModel
+        n_traj: number of trajectories per input state
+        seed: seed of the Kraus operator draws
+
+    Returns:
+        (n_traj, B) array of probabilities of measuring 0 on the ancilla
+    """
+    rng = np.random.RandomState(seed)
+    num_ref = len(trash)
+    offset = 1 + num_ref
+    states = np.reshape(states, (-1, 2 ** template.num_qubits))
+
+    # ancilla and references in |0>, one copy of the inputs per trajectory
+    extended = np.zeros((len(states), 2 ** offset, states.shape[1]),
+                        dtype=complex)
+    extended[:, 0] = states
+    register = StateVector(np.tile(extended.reshape(len(states), -1),
+                                   (n_traj, 1)),
+                           offset + template.num_qubits, template.dtype)
+
+    bound = template.bind_params(params)
+    for record in template.records:
+        axes = [offset + axis for axis in record.axes]
+        register.contract_axes(bound[record.kind], axes)
+        noise.apply(register, axes, rng)
+
+    register.axes = list(range(1, offset + 1)) + \
+        [offset + axis for axis in template.axes]
+
+    swap_test = [(HADAMARD, [0])] + \
+        [(FREDKIN, [0, 1 + index, offset + qubit])
+         for index, qubit in enumerate(trash)] + [(HADAMARD, [0])]
+
+    for gate, qubits in swap_test:
+        register.contract(gate, qubits)
+        noise.apply(register, [register.axes[qubit] for qubit in qubits], rng)
+
+    ancilla = np.take(register.tensor, 0, axis=register.axes[0])
+    probabilities = np.sum(np.abs(ancilla.reshape(len(ancilla), -1)) ** 2,
+                           axis=1)
+
+    return probabilities.reshape(n_traj, len(states))
+
+
+class Trajectories():
+    """Noisy Swap Test Fidelity by Monte Carlo Trajectories
+
+    Simulates the unit cell and the swap test register with a NoiseModel
+    after every gate. Memory stays at the statevector scale of the
+    (n + num_ref + 1) qubit register times the trajectories in flight,
+    instead of the squared size of a density matrix. Trajectories are run
+    in chunks, optionally spread over a process pool, which is started on
+    the first call and reused by every later one, e.g. the cost evaluations
+    of an optimizer, until close.
+
+    Attributes:
+        circuit: Circuit providing the templates and the trash qubits
+        noise: NoiseModel
+        n_traj: number of trajectories per input state
+        chunk_size: number of trajectories per chunk
+        processes: size of the process pool, 1 runs in this process and
+            None uses all cores
+        pool: executor running the chunks, None until first needed
+        rng: numpy RandomState seeding the chunks
+    """
+
+    def __init__(self, circuit, noise, n_traj=100, chunk_size=25,
+                 processes=1, seed=None, pool=None):
+        """ Init Trajectories
+
+        Args:
+            pool: optional executor shared with other users, left running
+                by close, instead of a pool of this instance's processes
+
+        Raises:
+            Exception: An error if there are fewer than 2 trajectories, which
+                leave the standard error undefined
+        """
+        if n_traj < 2:
+            raise Exception('Trajectories need n_traj of at least 2')
+
+        self.circuit = circuit
+        self.noise = noise
+        self.n_traj = n_traj
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.pool = pool
+        self.owns_pool = pool is None
+        self.rng = np.random.RandomState(seed)
+
+    def close(self):
+        """ Shut Down the Process Pool Started by this Instance
+        """
+        if self.owns_pool and self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def probabilities(self, model, params, states):
+        """ Swap Test Probability of every Trajectory
+
+        Args:
+            model: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            states: (B, 2^n) array of input states
+
+        Returns:
+            (n_traj, B) array
+        """
+        sizes = [min(self.chunk_size, self.n_traj - start)
+                 for start in range(0, self.n_traj, self.chunk_size)]
+        seeds = self.rng.randint(2 ** 31, size=len(sizes))
+        args = [(self.circuit.templates[model], self.circuit.trash, params,
+                 states, self.noise, size, seed)
+                for size, seed in zip(sizes, seeds)]
+
+        with self.circuit.instrument.stage('trajectories'):
+            if self.pool is None and self.processes == 1:
+                chunks = [run_trajectories(*arg) for arg in args]
+            else:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(max_workers=self.processes)
+                chunks = list(self.pool.map(run_trajectories, *zip(*args)))
+
+        self.circuit.instrument.count('trajectories', self.n_traj * len(
+            np.reshape(states, (-1, 2 ** self.circuit.num_qubits))))
+
+        return np.concatenate(chunks)
+
+    def fidelity(self, model, params, states):
+        """ Average Noisy Swap Test Fidelity
+
+        Args:
+            model: model 'a' or 'b'
+            params: array of rotations required for gate operations
+            states: (B, 2^n) array of input states
+
+        Returns:
+            mean probability of measuring 0 on the ancilla and its standard
+            error over the trajectories, from the sample standard deviation
+        """
+        probabilities = self.probabilities(model, params, states)
+        means = np.mean(probabilities, axis=1)
+
+        return np.mean(means), np.std(means, ddof=1) / np.sqrt(len(means))
@@ -0,0 +1,270 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class Optimizer(ABC):
+    """Batched Local Optimizer Backend for Autoencoder.optimize
+
+    A backend runs n_iter steps, each one evaluating all the parameter
+    vectors it needs, the current point and its perturbations, as a single
+    Circuit.batch_fidelities call. After each step the callback receives
+    the current point and cost like a basin-hopping hop, and returning True
+    stops the run. Subclasses must implement step.
+
+    The backend holds the state of its run, which Autoencoder.optimize
+    checkpoints along with the backend itself. Continuing from a restored
+    backend takes the same steps as the uninterrupted run would have.
+
+    Attributes:
+        evaluations: parameter vectors evaluated in the run
+        state: None before a run, else a dictionary of the next params, the
+            best OptimizeResult so far and the number of steps taken
+    """
+
+    def __init__(self):
+        """ Init Optimizer
+        """
+        self.reset()
+
+    def reset(self):
+        """ Forget the Previous Run
+        """
+        self.evaluations = 0
+        self.state = None
+
+    def costs(self, circuit, model, params, states, shots=None, rng=None):
+        """ Cost of a Batch of Parameter Vectors in one Call
+
+        Args:
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
+            params: (P, n_params) array
+            states: (B, 16) array of training states
+            shots: optional number of swap test shots per state
+            rng: numpy RandomState of the shots
+
+        Returns:
+            (P,) array
+        """
+        self.evaluations += len(params)
+        circuit.instrument.count('cost_evals', len(params))
+
+        return 1 - circuit.batch_fidelities(model, params, states, shots, rng)
+
+    @abstractmethod
+    def step(self, circuit, model, params, bounds, states, iteration, shots,
+             rng):
+        """ One Step from params
+
+        Args:
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
+            params: current parameters
+            bounds: (lower, upper) arrays of the parameter bounds
+            states: (B, 16) array of training states
+            iteration: steps taken so far, for the step size schedules
+            shots: optional number of swap test shots per state
+            rng: numpy RandomState of the perturbations and shots
+
+        Returns:
+            next params and the cost at params
+        """
+
+    def minimize(self, circuit, model, init, bounds, states, n_iter=500,
+                 callback=None, rng=None, shots=None, start=0):
+        """ Run the Backend
+
+        Args:
+            circuit: Circuit evaluating the swap test fidelity
+            model: A string indicating which model to use
+            init: An list of initial parameters for gate operations, unused
+                when continuing a run
+            bounds: A set of tuples representing the upper and lower bounds
+                for each parameter
+            states: (B, 16) array of training states
+            n_iter: An integer number of steps
+            callback: optional callback(x, cost, accept) run after each step
+            rng: numpy RandomState of the perturbations and shots
+            shots: optional number of swap test shots per state
+            start: steps already taken by the run this continues, for the
+                step size schedules. When the backend's state has taken as
+                many steps, as one restored from a checkpoint has, the run
+                continues from it, otherwise a new run starts from init
+
+        Returns:
+            OptimizeResult with the best params seen as x and their cost
+        """
+        from scipy.optimize import OptimizeResult
+
+        rng = np.random.RandomState() if rng is None else rng
+        lower, upper = np.array(bounds, dtype=float).T
+
+        if start == 0 or self.state is None or self.state['steps'] != start:
+            self.reset()
+            params = np.clip(np.array(init, dtype=float), lower, upper)
+            self.state = {'params': params, 'steps': start,
+                          'best': OptimizeResult(x=params, fun=np.inf,
+                                                 nit=0)}
+
+        params, best = self.state['params'], self.state['best']
+
+        for iteration in range(start, start + n_iter):
+            update, cost = self.step(circuit, model, params, (lower, upper),
+                                     states, iteration, shots, rng)
+
+            if cost < best.fun:
+                best.x, best.fun = params, cost
+            best.nit += 1
+
+            # stored before the callback, which may checkpoint the backend
+            self.state['params'] = np.clip(update, lower, upper)
+            self.state['steps'] = iteration + 1
+
+            if callback is not None and callback(params, cost, True):
+                break
+
+            params = self.state['params']
+
+        best.nfev = self.evaluations
+
+        return best
+
+
+class SPSA(Optimizer):
+    """Simultaneous Perturbation Stochastic Approximation
+
+    Each step estimates the gradient from samples random +-1 directions,
+    evaluating the current point and its 2 * samples perturbations in one
+    batched call. The cost of a step does not grow with the number of
+    parameters, and it tolerates a sampled cost.
+
+    Attributes:
+        a, c: initial step size and perturbation width
+        alpha, gamma: decay exponents of the step size and the width
+        stability: offset A of the step size schedule
+        samples: number of perturbation directions averaged per step
+    """
+
+    def __init__(self, a=1.0, c=0.1, alpha=0.602, gamma=0.101, stability=10,
+                 samples=4):
+        """ Init SPSA
+        """
+        super(SPSA, self).__init__()
+        self.a = a
+        self.c = c
+        self.alpha = alpha
+        self.gamma = gamma
+        self.stability = stability
+        self.samples = samples
+
+    def step(self, circuit, model, params, bounds, states, iteration, shots,
+             rng):
+        """ One SPSA Step
+        """
+        gain = self.a / (iteration + 1 + self.stability) ** self.alpha
+        width = self.c / (iteration + 1) ** self.gamma
+
+        directions = rng.choice([-1.0, 1.0], size=(self.samples, len(params)))
+        batch = np.concatenate([params[None], params + width * directions,
+                                params - width * directions])
+
+        costs = self.costs(circuit, model, batch, states, shots, rng)
+        plus, minus = costs[1:self.samples + 1], costs[self.samples + 1:]
+
+        gradient = np.mean(((plus - minus) / (2 * width))[:, None] *
+                           directions, axis=0)
+
+        return params - gain * gradient, costs[0]
+
+
+class Adam(Optimizer):
+    """Adam on the Fidelity Gradient
+
+    Without shots the gradient is the analytic one of
+    Circuit.fidelity_gradient. With shots, or gradient='central', it is a
+    central difference over every parameter, evaluated with the current
+    point as 2 * n_params + 1 vectors in one batched call. A difference of
+    sampled costs carries shot noise of order 1 / (delta sqrt(shots)),
+    while the cost is a smooth trigonometric function of the angles, so
+    with shots the width defaults to shots ** (-1 / 6), which balances that
+    noise against the delta ** 2 truncation error.
+
+    The moment estimates are part of the run state, and their bias
+    correction counts the updates since they were zeroed, so a continued
+    run keeps its moments and a fresh one is corrected from its own first
+    step.
+
+    Attributes:
+        rate: step size
+        beta_1, beta_2: decay of the first and second moment estimates
+        epsilon: denominator offset
+        delta: central difference width, None for 1e-3 without shots and
+            shots ** (-1 / 6) with them
+        gradient: 'analytic' or 'central'
+        moments: (2, n_params) first and second moment estimates
+        updates: number of updates of the moment estimates
+    """
+
+    def __init__(self, rate=0.05, beta_1=0.9, beta_2=0.999, epsilon=1e-8,
+                 delta=None, gradient='analytic'):
+        """ Init Adam
+        """
+        super(Adam, self).__init__()
+        self.rate = rate
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+        self.epsilon = epsilon
+        self.delta = delta
+        self.gradient = gradient
+
+    def reset(self):
+        """ Forget the Previous Run and its Moment Estimates
+        """
+        super(Adam, self).reset()
+        self.moments = None
+        self.updates = 0
+
+    def step(self, circuit, model, params, bounds, states, iteration, shots,
+             rng):
+        """ One Adam Step
+        """
+        if shots is None and self.gradient == 'analytic':
+            self.evaluations += 1
+            circuit.instrument.count('cost_evals')
+            circuit.instrument.count('grad_evals')
+            fidelity, gradient = circuit.fidelity_gradient(model, params,
+                                                           states)
+            cost, gradient = 1 - fidelity, -gradient
+        else:
+            delta = self.delta
+            if delta is None:
+                delta = 1e-3 if shots is None else shots ** (-1 / 6)
+
+            shifts = delta * np.eye(len(params))
+            batch = np.concatenate([params[None], params + shifts,
+                                    params - shifts])
+
+            costs = self.costs(circuit, model, batch, states, shots, rng)
+            cost = costs[0]
+            gradient = (costs[1:len(params) + 1] -
+                        costs[len(params) + 1:]) / (2 * delta)
+
+        if self.moments is None:
+            self.moments = np.zeros((2, len(params)))
+        self.updates += 1
+
+        self.moments[0] = self.beta_1 * self.moments[0] + \
+            (1 - self.beta_1) * gradient
+        self.moments[1] = self.beta_2 * self.moments[1] + \
+            (1 - self.beta_2) * gradient ** 2
+
+        first = self.moments[0] / (1 - self.beta_1 ** self.updates)
+        second = self.moments[1] / (1 - self.beta_2 ** self.updates)
+
+        return params - self.rate * first / (np.sqrt(second) +
+                                             self.epsilon), cost
+
+
+# backends by name, for the comparison harness and job specs
+OPTIMIZERS = {'spsa': SPSA, 'adam': Adam}
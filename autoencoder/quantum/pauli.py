@@ -0,0 +1,82 @@
+import numpy as np
+
+
+PAULI = {
+    'I': np.eye(2, dtype=complex),
+    'X': np.array([[0, 1], [1, 0]], dtype=complex),
+    'Y': np.array([[0, -1j], [1j, 0]], dtype=complex),
+    'Z': np.array([[1, 0], [0, -1]], dtype=complex),
+}
+
+
+class PauliSum():
+    """Hamiltonians as Weighted Sums of Pauli Strings
+
+    The Pauli string matrices are built once, and each string's weight is a
+    signed copy of one of a small set of coefficients. Hamiltonians for many
+    coefficient sets then come out of a single contraction, and their ground
+    states out of one batched eigh, instead of one Qobj sum per set.
+
+    Attributes:
+        labels: Pauli string of each term, e.g. 'ZIIZ', qubit 0 first
+        mixing: (n_coeffs, T) array mapping coefficients to term weights
+        basis: (T, 2^n, 2^n) array of the Pauli string matrices
+    """
+
+    def __init__(self, terms):
+        """ Init PauliSum
+
+        Args:
+            terms: list of (coefficient index, sign, pauli string) triples
+        """
+        self.labels = [label for index, sign, label in terms]
+
+        n_coeffs = max(index for index, sign, label in terms) + 1
+        self.mixing = np.zeros((n_coeffs, len(terms)))
+        for term, (index, sign, label) in enumerate(terms):
+            self.mixing[index, term] = sign
+
+        self.basis = np.array([self.string_matrix(label)
+                               for label in self.labels])
+
+    @staticmethod
+    def string_matrix(label):
+        """ Matrix of a Pauli String
+
+        Args:
+            label: string of I, X, Y and Z, qubit 0 first
+
+        Returns:
+            (2^n, 2^n) array
+        """
+        matrix = np.ones((1, 1), dtype=complex)
+        for pauli in label:
+            matrix = np.kron(matrix, PAULI[pauli])
+
+        return matrix
+
+    def hamiltonians(self, coeffs):
+        """ Hamiltonians for a Batch of Coefficient Sets
+
+        Args:
+            coeffs: (R, n_coeffs) array
+
+        Returns:
+            (R, 2^n, 2^n) array
+        """
+        weights = np.dot(np.atleast_2d(coeffs), self.mixing)
+
+        return np.tensordot(weights, self.basis, axes=([1], [0]))
+
+    def ground_states(self, coeffs):
+        """ Ground States for a Batch of Coefficient Sets
+
+        Args:
+            coeffs: (R, n_coeffs) array
+
+        Returns:
+            (R,) array of ground energies and (R, 2^n) array of ground states
+        """
+        energies, states = np.linalg.eigh(self.hamiltonians(coeffs))
+
+        return energies[:, 0], states[:, :, 0]
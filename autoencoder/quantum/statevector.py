@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class StateVector():
+    """Statevector Simulation of Qubit Registers
+
+    Hold a batch of n-qubit states as a (B, 2, ..., 2) tensor and apply gates
+    by contracting them directly into the qubit axes, rather than building the
+    full 2^n x 2^n operator. Swaps are never applied as matrices: Template
+    folds them into the axes each gate acts on and records the final
+    relabelling in axes, so the cost of a circuit is dominated by the gates
+    that actually act on the state.
+
+    Attributes:
+        num_qubits: number of qubits in each state of the batch
+        tensor: (B, 2, ..., 2) array of amplitudes
+        axes: tensor axis currently holding each logical qubit
+    """
+
+    def __init__(self, states, num_qubits, dtype=complex):
+        """ Init StateVector from one or more flat states
+
+        Args:
+            states: array of shape (2^n,), (2^n, 1) or (B, 2^n)
+            num_qubits: number of qubits n
+            dtype: complex128, or complex64 to halve memory and bandwidth,
+                gates are cast to it when they are contracted
+        """
+        self.num_qubits = num_qubits
+        self.tensor = np.asarray(states, dtype=dtype).reshape(
+            (-1,) + (2,) * num_qubits)
+
+        # axis 0 is the batch, qubit q starts on axis q + 1
+        self.axes = list(range(1, num_qubits + 1))
+
+    def contract(self, gate, qubits):
+        """ Contract a Gate into the Qubit Axes
+
+        A stack of K gates applies each gate to its own copy of the register,
+        growing the batch from B to K * B with the stack as the outer index.
+
+        Args:
+            gate: (2^m, 2^m) array or (K, 2^m, 2^m) stack
+            qubits: the m logical qubits the gate acts on
+        """
+        self.contract_axes(gate, [self.axes[qubit] for qubit in qubits])
+
+    def contract_axes(self, gate, axes):
+        """ Contract a Gate into Tensor Axes
+
+        Args:
+            gate: (2^m, 2^m) array or (K, 2^m, 2^m) stack
+            axes: the m tensor axes the gate acts on, ignoring relabelling
+        """
+        width = len(axes)
+        stack = np.shape(gate)[:-2]
+        lead = len(stack)
+
+        gate = np.reshape(np.asarray(gate, dtype=self.tensor.dtype),
+                          stack + (2,) * 2 * width)
+        output = np.tensordot(gate, self.tensor,
+                              axes=(list(range(lead + width, lead + 2 * width)),
+                                    axes))
+        output = np.moveaxis(output, list(range(lead, lead + width)),
+                             [lead + axis for axis in axes])
+
+        self.tensor = output.reshape((-1,) + output.shape[lead + 1:])
+
+    def contract_paired(self, gates, axes):
+        """ Contract one Gate per Block of the Batch into Tensor Axes
+
+        The batch is read as P blocks of equal size, one per circuit of a
+        batch of parameter vectors, and block p gets gates[p]. Unlike a
+        stack, this does not branch the register.
+
+        Args:
+            gates: (P, 2^m, 2^m) array
+            axes: the m tensor axes the gates act on
+        """
+        width = len(axes)
+        last = list(range(self.tensor.ndim - width, self.tensor.ndim))
+
+        tensor = np.moveaxis(self.tensor, axes, last)
+        shape = tensor.shape
+
+        gates = np.asarray(gates, dtype=self.tensor.dtype)
+        flat = np.matmul(tensor.reshape(len(gates), -1, 2 ** width),
+                         np.swapaxes(gates, -1, -2))
+
+        self.tensor = np.moveaxis(flat.reshape(shape), last, axes)
+
+    def to_array(self):
+        """ Flatten Tensor back to States
+
+        Returns:
+            (B, 2^n) array of amplitudes in the logical qubit order
+        """
+        ordered = self.tensor.transpose([0] + self.axes)
+
+        return ordered.reshape(ordered.shape[0], -1)
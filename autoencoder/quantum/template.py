@@ -0,0 +1,465 @@
+import copy
+
+import numpy as np
+
+import gates
+from statevector import StateVector
+
+
+# unitary_a in order of action on the state, as (step, qubits) pairs where a
+# 'swap' relabels two qubits and a 'cell' applies the two-qubit unit cell
+MODEL_A = (
+    # unitary_6
+    ('swap', (2, 1)), ('swap', (3, 2)), ('cell', (0, 1)), ('swap', (1, 2)),
+    ('swap', (2, 3)),
+    # unitary_5
+    ('swap', (2, 1)), ('cell', (2, 3)), ('swap', (1, 2)),
+    # unitary_4
+    ('swap', (1, 0)), ('cell', (1, 2)), ('swap', (0, 1)),
+    # unitary_3, unitary_2, unitary_1
+    ('cell', (2, 3)), ('cell', (1, 2)), ('cell', (0, 1)),
+)
+
+
+def model_b(num_qubits):
+    """ Layout of unitary_b on any Number of Qubits
+
+    rotate_all, then the rotations skipping each qubit from the last to the
+    first, then rotate_all again.
+    """
+    layers = [()] + [(skip,) for skip in reversed(range(num_qubits))] + [()]
+
+    return tuple(('rotation', (qubit,)) for skipped in layers
+                 for qubit in range(num_qubits) if qubit not in skipped)
+
+
+def brick_wall(num_qubits, layers):
+    """ Brick-Wall Layers of the Two Qubit Unit Cell
+
+    Each layer applies the cell to the pairs (0, 1), (2, 3), ... and then to
+    the pairs (1, 2), (3, 4), ... so every neighbouring pair is entangled.
+
+    Args:
+        num_qubits: number of input qubits
+        layers: number of layers
+    """
+    layout = []
+    for layer in range(layers):
+        for start in (0, 1):
+            layout.extend(('cell', (qubit, qubit + 1))
+                          for qubit in range(start, num_qubits - 1, 2))
+
+    return tuple(layout)
+
+
+MODEL_B = model_b(4)
+
+# exchanges the two qubits of a 4x4 gate
+SWAP = np.eye(4)[[0, 2, 1, 3]]
+
+
+class GateRecord():
+    """ Compiled Gate
+
+    Attributes:
+        kind: 'cell' or 'rotation', the parameterised gate applied
+        axes: register tensor axes the gate acts on, swaps already folded in
+    """
+    __slots__ = ('kind', 'axes')
+
+    def __init__(self, kind, axes):
+        self.kind = kind
+        self.axes = axes
+
+
+class FusedBlock():
+    """ Gates Merged into one Contraction
+
+    Attributes:
+        axes: register tensor axes of the block, one or two
+        ops: list of (record index, position of each record axis in axes)
+            in order of action
+    """
+    __slots__ = ('axes', 'ops')
+
+    def __init__(self, axes, ops):
+        self.axes = axes
+        self.ops = ops
+
+
+def fuse(records):
+    """ Gate Fusion Pass
+
+    Each gate joins the last block touching any of its axes when the union
+    of their axes is at most two qubits. Every block after that one acts on
+    other axes and commutes with the gate, so moving the gate back into it
+    does not change the circuit. Consecutive single qubit gates on a qubit
+    become one 2x2 block, and single qubit gates fold into the two qubit
+    block that follows or precedes them.
+
+    Args:
+        records: list of GateRecord in order of action
+
+    Returns:
+        list of FusedBlock in order of action
+    """
+    blocks = []
+    for index, record in enumerate(records):
+        last = None
+        for block in reversed(blocks):
+            if set(block.axes) & set(record.axes):
+                last = block
+                break
+
+        if last is None or len(set(last.axes) | set(record.axes)) > 2:
+            blocks.append(FusedBlock(record.axes, [index]))
+        else:
+            if not set(record.axes) <= set(last.axes):
+                last.axes = record.axes
+            last.ops.append(index)
+
+    for block in blocks:
+        block.ops = [(index, tuple(block.axes.index(axis)
+                                   for axis in records[index].axes))
+                     for index in block.ops]
+
+    return blocks
+
+
+class Template():
+    """Parametric Circuit Compiled Once per Model
+
+    The layout of a model only depends on which qubits each gate touches,
+    so the swaps are resolved into tensor axes once, leaving a flat list of
+    gate records and the final axis permutation. The records are then
+    fused into blocks of at most two qubits. Evaluating the circuit binds
+    the parameter vector to the gate matrices, multiplies them into the
+    block matrices and contracts one block at a time, without rebuilding
+    any structure.
+
+    Attributes:
+        num_qubits: number of input qubits
+        records: list of GateRecord in order of action on the state
+        blocks: list of FusedBlock contracted into the state, one per record
+            without fusion
+        axes: tensor axis holding each logical qubit after the last gate
+        dtype: complex dtype of the simulated states
+    """
+
+    def __init__(self, layout, num_qubits=4, fusion=True, dtype=complex):
+        """ Compile a Layout
+
+        Args:
+            layout: sequence of (step, qubits) pairs such as MODEL_A
+            num_qubits: number of input qubits
+            fusion: whether to run the gate fusion pass
+            dtype: complex128, or complex64 for single precision
+        """
+        self.num_qubits = num_qubits
+        self.dtype = dtype
+        self.records = []
+
+        axes = list(range(1, num_qubits + 1))
+        for step, qubits in layout:
+            if step == 'swap':
+                axes[qubits[0]], axes[qubits[1]] = \
+                    axes[qubits[1]], axes[qubits[0]]
+            else:
+                self.records.append(
+                    GateRecord(step, tuple(axes[qubit] for qubit in qubits)))
+
+        self.axes = axes
+
+        if fusion:
+            self.blocks = fuse(self.records)
+        else:
+            self.blocks = [FusedBlock(record.axes, [(index, tuple(
+                range(len(record.axes))))])
+                for index, record in enumerate(self.records)]
+
+    def astype(self, dtype):
+        """ Same Compiled Template Simulated in another Precision
+
+        Returns:
+            Template sharing the records and blocks of this one
+        """
+        template = copy.copy(self)
+        template.dtype = dtype
+
+        return template
+
+    def gate_counts(self):
+        """ Gate Counts before and after Fusion
+
+        Returns:
+            dictionary of 'before' and 'after', each counting the single and
+            two qubit contractions of one evaluation
+        """
+        def widths(gates):
+            return {'single': sum(len(gate.axes) == 1 for gate in gates),
+                    'two': sum(len(gate.axes) == 2 for gate in gates)}
+
+        return {'before': widths(self.records), 'after': widths(self.blocks)}
+
+    @staticmethod
+    def embed(gate, positions, width):
+        """ Gate on Part of a Block as a Matrix of the Block
+
+        Args:
+            gate: (..., 2, 2) or (..., 4, 4) array
+            positions: position of each gate qubit in the block axes
+            width: number of qubits of the block
+
+        Returns:
+            (..., 2^width, 2^width) array
+        """
+        if len(positions) == width:
+            if positions == (1, 0):
+                return np.matmul(SWAP, np.matmul(gate, SWAP))
+            return gate
+
+        identity = np.eye(2)
+        if positions[0] == 0:
+            return gates.kron(gate, identity)
+
+        return gates.kron(identity, gate)
+
+    def block_gates(self, block, bound):
+        """ Gates of a Fused Block as Matrices of the Block
+
+        Returns:
+            list of (..., 2^m, 2^m) arrays in order of action
+        """
+        return [self.embed(bound[self.records[index].kind], positions,
+                           len(block.axes))
+                for index, positions in block.ops]
+
+    def block_matrix(self, block, bound):
+        """ Matrix of a Fused Block
+
+        Args:
+            block: FusedBlock
+            bound: result of bind_params
+
+        Returns:
+            (..., 2^m, 2^m) array for a block of m qubits
+        """
+        matrix = None
+        for gate in self.block_gates(block, bound):
+            matrix = gate if matrix is None else np.matmul(gate, matrix)
+
+        return matrix
+
+    @staticmethod
+    def bind(kind, params):
+        """ Gate Matrix of a Parameterised Gate
+
+        Args:
+            kind: 'cell' or 'rotation'
+            params: array of rotations, or (P, n_params) batch of them
+
+        Returns:
+            4x4 unit cell from params[:15] or 2x2 rotation from params[:3],
+            with a leading P axis for a batch
+        """
+        params = np.asarray(params, dtype=float)
+
+        if kind == 'cell':
+            return gates.two_qubit_gate(params[..., :15])
+
+        return gates.single_qubit_gate(params[..., 0], params[..., 1],
+                                       params[..., 2])
+
+    @staticmethod
+    def bind_grad(kind, params):
+        """ Derivatives of a Parameterised Gate
+
+        Returns:
+            (15, 4, 4) or (3, 2, 2) stack, one derivative per parameter
+        """
+        if kind == 'cell':
+            return gates.two_qubit_gate_grad(params[:15])
+
+        return gates.single_qubit_gate_grad(params[0], params[1], params[2])
+
+    def bind_params(self, params):
+        """ Gate Matrices of every Parameterised Gate in the Template
+
+        Args:
+            params: array of rotations
+
+        Returns:
+            dictionary of gate kind to its matrix
+        """
+        return dict((kind, self.bind(kind, params))
+                    for kind in set(record.kind for record in self.records))
+
+    def run(self, params, states, bound=None):
+        """ Evolve States through the Bound Circuit
+
+        Args:
+            params: array of rotations
+            states: (B, 2^n) array of input states
+            bound: optional result of bind_params(params), to reuse across
+                runs with the same params
+
+        Returns:
+            (B, 2^n) array
+        """
+        if bound is None:
+            bound = self.bind_params(params)
+
+        register = StateVector(states, self.num_qubits, self.dtype)
+        for block in self.blocks:
+            register.contract_axes(self.block_matrix(block, bound),
+                                   block.axes)
+
+        register.axes = list(self.axes)
+
+        return register.to_array()
+
+    def run_paired(self, params, states, bound=None):
+        """ Evolve States through a Batch of Bound Circuits
+
+        Every parameter vector gets its own copy of the states, so P circuits
+        cost one pass of (P * B) contractions instead of P runs.
+
+        Args:
+            params: (P, n_params) array of parameter vectors
+            states: (B, 2^n) array of input states
+            bound: optional result of bind_params(params)
+
+        Returns:
+            (P, B, 2^n) array
+        """
+        params = np.atleast_2d(params)
+        states = np.reshape(states, (-1, 2 ** self.num_qubits))
+
+        if bound is None:
+            bound = self.bind_params(params)
+
+        register = StateVector(
+            np.broadcast_to(states, (len(params),) + states.shape),
+            self.num_qubits, self.dtype)
+        for block in self.blocks:
+            register.contract_paired(self.block_matrix(block, bound),
+                                     block.axes)
+
+        register.axes = list(self.axes)
+
+        return register.to_array().reshape((len(params),) + states.shape)
+
+    def run_adjoint(self, params, states, bound=None):
+        """ Evolve States through the Inverse of the Bound Circuit
+
+        The blocks are undone in reverse order with the conjugate transpose
+        of each block, starting from the axes the forward run ends on.
+
+        Args:
+            params: array of rotations
+            states: (B, 2^n) array of states in the logical qubit order
+            bound: optional result of bind_params(params)
+
+        Returns:
+            (B, 2^n) array
+        """
+        if bound is None:
+            bound = self.bind_params(params)
+
+        register = self.end_register(states)
+        for block in reversed(self.blocks):
+            matrix = self.block_matrix(block, bound)
+            register.contract_axes(np.conj(np.swapaxes(matrix, -1, -2)),
+                                   block.axes)
+
+        return register.to_array()
+
+    def end_register(self, states):
+        """ Register of States Laid Out as a Forward Run Leaves it
+
+        Args:
+            states: (B, 2^n) array of states in the logical qubit order
+
+        Returns:
+            StateVector with logical qubit q on the axis the forward run
+            left it on, undoing every block returns it to the usual layout
+        """
+        register = StateVector(states, self.num_qubits, self.dtype)
+        order = [0] * (self.num_qubits + 1)
+        for qubit, axis in enumerate(self.axes):
+            order[axis] = qubit + 1
+        register.tensor = register.tensor.transpose(order)
+
+        return register
+
+    @staticmethod
+    def block_rows(register, axes):
+        """ Register Amplitudes with the Block Axes Last
+
+        Returns:
+            (B * 2^(n - m), 2^m) array, one row per value of the other axes
+        """
+        tensor = np.moveaxis(register.tensor, axes,
+                             list(range(-len(axes), 0)))
+
+        return tensor.reshape(-1, 2 ** len(axes))
+
+    def gradient(self, params, evolved_states, adjoints, bound=None):
+        """ Gradient of Re <adjoints|U|states> by one Backward Sweep
+
+        U is the bound circuit and evolved_states = U states. The sweep undoes
+        one block at a time on the evolved states and the adjoints together.
+        Between the two, each gate of the block adds its derivative, through
+        the cross matrix of the pair over the block's qubits, so the whole
+        gradient costs about two more runs of the circuit however many gates
+        it has.
+
+        Args:
+            params: array of rotations
+            evolved_states: (B, 2^n) array, run(params, states)
+            adjoints: (B, 2^n) array of adjoint states at the output
+            bound: optional result of bind_params(params)
+
+        Returns:
+            real array with one entry per parameter the gates take, 15 for
+            unit cells and 3 for rotations
+        """
+        if bound is None:
+            bound = self.bind_params(params)
+        derivatives = dict((kind, self.bind_grad(kind, params))
+                           for kind in bound)
+
+        states = self.end_register(evolved_states)
+        adjoint = self.end_register(adjoints)
+        gradient = np.zeros(max(len(stack) for stack in derivatives.values()))
+
+        for block in reversed(self.blocks):
+            width = len(block.axes)
+            matrices = self.block_gates(block, bound)
+            matrix = self.block_matrix(block, bound)
+            inverse = np.conj(np.swapaxes(matrix, -1, -2))
+
+            states.contract_axes(inverse, block.axes)
+
+            # <adjoint|A|states> = sum of A * cross for a block matrix A
+            cross = np.dot(self.block_rows(adjoint, block.axes).conj().T,
+                           self.block_rows(states, block.axes))
+
+            # gates after each one in the block, then the gates before it
+            after = [np.eye(2 ** width)]
+            for gate in reversed(matrices[1:]):
+                after.insert(0, np.dot(after[0], gate))
+
+            before = np.eye(2 ** width)
+            for gate, following, (index, positions) in zip(matrices, after,
+                                                           block.ops):
+                stack = self.embed(derivatives[self.records[index].kind],
+                                   positions, width)
+                tangent = np.matmul(following, np.matmul(stack, before))
+                gradient[:len(stack)] += np.einsum('koi,oi->k', tangent,
+                                                   cross).real
+                before = np.dot(gate, before)
+
+            adjoint.contract_axes(inverse, block.axes)
+
+        return gradient
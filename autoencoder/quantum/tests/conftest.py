@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# the quantum modules import each other by bare module name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+from random import seed as random_seed
+
+import numpy as np
+import pytest
+
+from autoencoder import N_PARAMS, Autoencoder
+from checkpoint import Checkpoint
+from instrument import Instrument
+from optimizers import SPSA, Adam
+from test_circuit import STATES, random_states
+
+
+class Interrupt(Exception):
+    """ Stands in for a killed job
+    """
+
+
+def interrupt_after(hops, trace):
+    """ Callback recording (params, cost) and interrupting after hops
+    """
+    def callback(params, cost, accept):
+        trace.append((np.copy(params), cost))
+        if len(trace) == hops:
+            raise Interrupt()
+
+    return callback
+
+
+def start(model='b'):
+    encoder = Autoencoder(STATES)
+    random_seed(0)
+
+    return (encoder, encoder.get_circuit(model),
+            encoder.get_params(N_PARAMS[model]),
+            encoder.get_bounds(N_PARAMS[model]))
+
+
+@pytest.mark.parametrize('backend', [SPSA, Adam])
+def test_resume_replays_uninterrupted_run(tmpdir, backend):
+    encoder, circuit, init, bounds = start()
+
+    full = []
+    res = encoder.optimize(circuit, 'b', init, bounds, n_iter=10, seed=3,
+                           optimizer=backend(),
+                           callback=lambda x, cost, accept:
+                           full.append((np.copy(x), cost)))
+
+    checkpoint = Checkpoint(str(tmpdir.join('run.pkl')), every=2)
+    trace = []
+    with pytest.raises(Interrupt):
+        encoder.optimize(circuit, 'b', init, bounds, n_iter=10, seed=3,
+                         optimizer=backend(), checkpoint=checkpoint,
+                         callback=interrupt_after(5, trace))
+
+    # the last checkpoint is from hop 4, hop 5 is done again
+    assert checkpoint.load()['iteration'] == 4
+    del trace[4:]
+
+    resumed = Autoencoder(STATES).resume(
+        checkpoint, callback=lambda x, cost, accept:
+        trace.append((np.copy(x), cost)))
+
+    assert len(trace) == len(full)
+    for (params, cost), (full_params, full_cost) in zip(trace, full):
+        np.testing.assert_array_equal(params, full_params)
+        assert cost == full_cost
+
+    np.testing.assert_array_equal(resumed.x, res.x)
+    assert resumed.fun == res.fun
+
+    state = checkpoint.load()
+    assert state['done'] and state['iteration'] == 10
+    assert state['fidelity'] == 1 - res.fun
+
+
+def test_resume_continues_basinhopping(tmpdir):
+    encoder, circuit, init, bounds = start()
+
+    checkpoint = Checkpoint(str(tmpdir.join('run.pkl')), every=1)
+    with pytest.raises(Interrupt):
+        encoder.optimize(circuit, 'b', init, bounds, n_iter=4, seed=3,
+                         checkpoint=checkpoint,
+                         callback=interrupt_after(3, []))
+
+    # the initial minimization is not an iteration
+    interrupted = checkpoint.load()
+    assert interrupted['iteration'] == 2 and not interrupted['done']
+
+    hops = []
+    Autoencoder(STATES).resume(checkpoint, callback=lambda x, cost, accept:
+                               hops.append(cost))
+
+    state = checkpoint.load()
+    assert state['done'] and state['iteration'] == 4
+    assert len(hops) == 1 + 4 - 2
+    assert state['fidelity'] >= interrupted['fidelity']
+
+
+def test_sweep_resumes_interrupted_distance(tmpdir):
+    internuc_dist = np.array([0.5, 1.0, 1.5])
+    states = random_states(3, seed=1)
+
+    random_seed(0)
+    full = Autoencoder(STATES).sweep('b', internuc_dist, states, n_iter=6,
+                                     seed=2, optimizer=SPSA())
+
+    # killed at the fourth hop of the second distance
+    hops = []
+
+    def kill(event):
+        if event['event'] == 'hop':
+            hops.append(event)
+            if len(hops) == 6 + 4:
+                raise Interrupt()
+
+    checkpoint_dir = str(tmpdir.join('sweep'))
+    random_seed(0)
+    with pytest.raises(Interrupt):
+        Autoencoder(STATES, instrument=Instrument(callbacks=[kill])).sweep(
+            'b', internuc_dist, states, n_iter=6, seed=2,
+            checkpoint_dir=checkpoint_dir, every=1, optimizer=SPSA())
+
+    random_seed(0)
+    resumed = Autoencoder(STATES).sweep('b', internuc_dist, states, n_iter=6,
+                                        seed=2, checkpoint_dir=checkpoint_dir,
+                                        every=1, optimizer=SPSA())
+
+    for result, full_result in zip(resumed, full):
+        assert result['distance'] == full_result['distance']
+        np.testing.assert_array_equal(result['params'], full_result['params'])
+        assert result['fidelity'] == full_result['fidelity']
@@ -0,0 +1,185 @@
+import numpy as np
+import pytest
+
+from autoencoder import N_PARAMS
+from circuit import Circuit
+from compression import Compressor
+from template import MODEL_A, MODEL_B, Template, brick_wall, model_b
+
+
+def random_states(count, num_qubits=4, seed=0):
+    """ (count, 2^n) array of random normalized states
+    """
+    rng = np.random.RandomState(seed)
+    shape = (count, 2 ** num_qubits)
+    states = rng.normal(size=shape) + 1j * rng.normal(size=shape)
+
+    return states / np.linalg.norm(states, axis=1, keepdims=True)
+
+
+def random_params(model, seed=1, count=None):
+    """ Rotations of a model, or a (count, n_params) batch of them
+    """
+    size = N_PARAMS[model] if count is None else (count, N_PARAMS[model])
+
+    return np.random.RandomState(seed).uniform(0, 2 * np.pi, size)
+
+
+def central_differences(func, params, delta=1e-6):
+    """ Central Difference Gradient of a Scalar Function
+    """
+    return np.array([(func(params + delta * shift) -
+                      func(params - delta * shift)) / (2 * delta)
+                     for shift in np.eye(len(params))])
+
+
+STATES = random_states(3)
+
+
+@pytest.mark.parametrize('model', ['a', 'b'])
+@pytest.mark.parametrize('trash', [None, [1, 3]])
+def test_gradient_matches_central_differences(model, trash):
+    circuit = Circuit(2, None, method='analytic', trash=trash)
+    params = random_params(model)
+
+    fidelity, gradient = circuit.fidelity_gradient(model, params, STATES)
+
+    assert fidelity == pytest.approx(
+        circuit.batch_fidelity(model, params, STATES), abs=1e-14)
+    np.testing.assert_allclose(gradient, central_differences(
+        lambda x: circuit.batch_fidelity(model, x, STATES), params),
+        atol=1e-8)
+
+
+@pytest.mark.parametrize('fusion', [True, False])
+@pytest.mark.parametrize('layout, num_qubits, n_params',
+                         [(brick_wall(6, 2), 6, 15), (model_b(8), 8, 3)])
+def test_template_gradient_on_wide_circuits(layout, num_qubits, n_params,
+                                            fusion):
+    template = Template(layout, num_qubits, fusion=fusion)
+    params = np.random.RandomState(2).uniform(0, 2 * np.pi, n_params)
+    states = random_states(2, num_qubits)
+    adjoints = random_states(2, num_qubits, seed=3)
+
+    gradient = template.gradient(params, template.run(params, states),
+                                 adjoints)
+
+    np.testing.assert_allclose(gradient, central_differences(
+        lambda x: np.vdot(adjoints, template.run(x, states)).real, params),
+        atol=1e-8)
+
+
+@pytest.mark.parametrize('trash', [[0, 0], [1], [0, 4]])
+def test_trash_must_be_distinct_input_qubits(trash):
+    with pytest.raises(Exception, match='distinct input qubits'):
+        Circuit(2, None, trash=trash)
+
+
+@pytest.mark.parametrize('model', ['a', 'b'])
+def test_evolve_matches_unitary(model):
+    qutip = pytest.importorskip('qutip')
+    input_state = qutip.Qobj(STATES[0].reshape(-1, 1),
+                             dims=[[2] * 4, [1] * 4])
+    circuit = Circuit(2, input_state)
+    params = random_params(model)
+
+    evolved = circuit.evolve(model, params)
+    reference = circuit.get_unitary(model, params) * input_state
+
+    np.testing.assert_allclose(evolved.full(), reference.full(), atol=1e-12)
+
+
+@pytest.mark.parametrize('model', ['a', 'b'])
+@pytest.mark.parametrize('num_ref', [2, 3])
+def test_swap_test_matches_analytic(model, num_ref):
+    qutip = pytest.importorskip('qutip')
+    input_state = qutip.Qobj(STATES[1].reshape(-1, 1),
+                             dims=[[2] * 4, [1] * 4])
+    params = random_params(model)
+
+    simulated = Circuit(num_ref, input_state, method='swap_test')
+    analytic = Circuit(num_ref, input_state, method='analytic')
+
+    assert simulated.get_fidelity(model, params) == pytest.approx(
+        analytic.get_fidelity(model, params), abs=1e-10)
+
+
+@pytest.mark.parametrize('model', ['a', 'b'])
+def test_batch_fidelities_match_rows(model):
+    circuit = Circuit(2, None, method='analytic')
+    params = random_params(model, count=5)
+
+    np.testing.assert_allclose(
+        circuit.batch_fidelities(model, params, STATES),
+        [circuit.batch_fidelity(model, row, STATES) for row in params],
+        atol=1e-14)
+    assert circuit.batch_fidelities(model, params[0], STATES) == \
+        pytest.approx(circuit.batch_fidelity(model, params[0], STATES),
+                      abs=1e-14)
+
+
+@pytest.mark.parametrize('model', ['a', 'b'])
+def test_single_precision_within_tolerance(model):
+    circuit = Circuit(2, None, method='analytic', precision='single')
+    single, double = circuit.check_precision(model, random_params(model),
+                                             STATES)
+
+    assert abs(single - double) < 1e-4
+
+
+@pytest.mark.parametrize('layout, num_qubits',
+                         [(MODEL_A, 4), (MODEL_B, 4), (brick_wall(6, 3), 6),
+                          (model_b(6), 6)])
+def test_fusion_preserves_circuit(layout, num_qubits):
+    fused = Template(layout, num_qubits)
+    unfused = Template(layout, num_qubits, fusion=False)
+    params = np.random.RandomState(4).uniform(0, 2 * np.pi, (2, 15))
+    states = random_states(3, num_qubits)
+
+    # neighbouring unit cells share one qubit and stay apart
+    counts = fused.gate_counts()
+    assert sum(counts['after'].values()) <= sum(counts['before'].values())
+    if layout[0][0] == 'rotation':
+        assert counts['after']['single'] < counts['before']['single']
+
+    np.testing.assert_allclose(fused.run(params[0], states),
+                               unfused.run(params[0], states), atol=1e-12)
+    np.testing.assert_allclose(fused.run_paired(params, states),
+                               unfused.run_paired(params, states),
+                               atol=1e-12)
+    np.testing.assert_allclose(fused.run_adjoint(params[0], states),
+                               unfused.run_adjoint(params[0], states),
+                               atol=1e-12)
+    np.testing.assert_allclose(
+        fused.run_adjoint(params[0], fused.run(params[0], states)), states,
+        atol=1e-12)
+
+
+@pytest.mark.parametrize('max_dense_qubits', [10, 0])
+def test_compressor_round_trip(tmpdir, max_dense_qubits):
+    circuit = Circuit(2, None, method='analytic')
+    compressor = Compressor(circuit, 'a', random_params('a'), chunk_size=2,
+                            max_dense_qubits=max_dense_qubits)
+
+    # states the encoder maps exactly into the code space
+    latents = random_states(5, num_qubits=2)
+    states = np.concatenate(list(compressor.decompress(latents)))
+    np.testing.assert_allclose(np.linalg.norm(states, axis=1), 1.)
+
+    codes, fidelities = zip(*compressor.compress(states))
+    np.testing.assert_allclose(np.concatenate(fidelities), 1.)
+    np.testing.assert_allclose(np.concatenate(codes), latents, atol=1e-12)
+    np.testing.assert_allclose(
+        np.concatenate(list(compressor.decompress(np.concatenate(codes)))),
+        states, atol=1e-12)
+
+    # through .npy files, and the trash fidelity of arbitrary states
+    source, target = str(tmpdir.join('states.npy')), \
+        str(tmpdir.join('latents.npy'))
+    np.save(source, np.concatenate([states, STATES]))
+    fidelities = compressor.compress_to(source, target)
+
+    np.testing.assert_allclose(np.load(target)[:5], latents, atol=1e-12)
+    np.testing.assert_allclose(
+        fidelities[5:],
+        2 * circuit.trash_probabilities(compressor.encode(STATES)) - 1)
@@ -0,0 +1,94 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from hydrogen import H2_HAMILTONIAN, Hydrogen, h2_coefficients
+
+
+# STO-3G integrals of H2 at 0.7414 Angstrom, whose full CI energy is
+# -1.1373 Hartree
+H_MO = np.diag([-1.2525, -0.4759])
+J_GG, J_UU, J_GU, K_GU = 0.6746, 0.6975, 0.6636, 0.1813
+NUCLEAR = 0.7137
+FCI_ENERGY = -1.1373
+
+
+def two_electron(j_gg, j_uu, j_gu, k_gu):
+    """ (2, 2, 2, 2) integrals (pq|rs) with the symmetry of H2
+    """
+    eri = np.zeros((2, 2, 2, 2))
+    eri[0, 0, 0, 0], eri[1, 1, 1, 1] = j_gg, j_uu
+    eri[0, 0, 1, 1] = eri[1, 1, 0, 0] = j_gu
+    for index in [(0, 1, 0, 1), (0, 1, 1, 0), (1, 0, 0, 1), (1, 0, 1, 0)]:
+        eri[index] = k_gu
+
+    return eri
+
+
+def fermionic_hamiltonian(h_mo, eri_mo, nuclear):
+    """ Second Quantized Hamiltonian through explicit JW Operators
+    """
+    lower, parity = np.array([[0., 1.], [0., 0.]]), np.diag([1., -1.])
+    ops = []
+    for p in range(4):
+        matrix = np.ones((1, 1))
+        for factor in [parity] * p + [lower] + [np.eye(2)] * (3 - p):
+            matrix = np.kron(matrix, factor)
+        ops.append(matrix)
+
+    hamiltonian = nuclear * np.eye(16)
+    for p, q in itertools.product(range(4), repeat=2):
+        if p % 2 == q % 2:
+            hamiltonian += h_mo[p // 2, q // 2] * ops[p].T.dot(ops[q])
+    for p, q, r, s in itertools.product(range(4), repeat=4):
+        if p % 2 == q % 2 and r % 2 == s % 2:
+            hamiltonian += 0.5 * eri_mo[p // 2, q // 2, r // 2, s // 2] * \
+                ops[p].T.dot(ops[r].T).dot(ops[s]).dot(ops[q])
+
+    return hamiltonian
+
+
+def test_coefficients_match_fermionic_hamiltonian():
+    rng = np.random.RandomState(0)
+    h_mo = np.diag(rng.normal(size=2))
+    eri_mo = two_electron(*rng.uniform(size=4))
+
+    coeffs = h2_coefficients(h_mo, eri_mo, 0.5)
+
+    np.testing.assert_allclose(H2_HAMILTONIAN.hamiltonians(coeffs)[0],
+                               fermionic_hamiltonian(h_mo, eri_mo, 0.5),
+                               atol=1e-12)
+
+
+def test_distance_states_from_cache(tmpdir):
+    hydrogen = Hydrogen(cache_dir=str(tmpdir), prepare=False)
+    internuc_dist = np.array([1.4, 0.7])
+
+    # equilibrium integrals, and the same with the exchange integral removed
+    coeffs = [h2_coefficients(H_MO, two_electron(J_GG, J_UU, J_GU, 0.), 1.),
+              h2_coefficients(H_MO, two_electron(J_GG, J_UU, J_GU, K_GU),
+                              NUCLEAR)]
+    hydrogen.save_cache(hydrogen.get_cache_path(internuc_dist),
+                        internuc_dist, [0., 0.], coeffs, -1.)
+
+    distances, states = hydrogen.get_distance_states(internuc_dist)
+
+    np.testing.assert_allclose(distances, [0.7, 1.4])
+    assert states.shape == (2, 16)
+    np.testing.assert_allclose(np.linalg.norm(states, axis=1), 1.)
+
+    # mostly the Hartree Fock state |1100>, with a little |0011>
+    hamiltonian = H2_HAMILTONIAN.hamiltonians(coeffs[1])[0]
+    energy = np.vdot(states[0], hamiltonian.dot(states[0])).real
+    assert abs(energy - FCI_ENERGY) < 1e-3
+    assert np.abs(states[0, 12]) ** 2 > 0.98
+    assert np.abs(states[0, 3]) ** 2 > 0.01
+
+    # without exchange nothing mixes the determinants
+    np.testing.assert_allclose(np.abs(states[1, 12]), 1.)
+
+
+def test_ground_states_rejects_energies():
+    with pytest.raises(Exception, match='Coefficients'):
+        Hydrogen.get_ground_states([-1.1, -1.0])
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from autoencoder import N_PARAMS
+from hydrogen import INTERNUC_DIST, Hydrogen, h2_coefficients
+from jobs import Job, ResultStore
+
+
+def write_cache(cache_dir, internuc_dist):
+    """ Hartree Fock Cache of Synthetic Integrals along a Distance Grid
+    """
+    hydrogen = Hydrogen(cache_dir, prepare=False)
+    coeffs = []
+    for r in internuc_dist:
+        eri = np.zeros((2, 2, 2, 2))
+        eri[0, 0, 0, 0], eri[1, 1, 1, 1] = 0.67, 0.70
+        eri[0, 0, 1, 1] = eri[1, 1, 0, 0] = 0.66
+        for index in [(0, 1, 0, 1), (0, 1, 1, 0), (1, 0, 0, 1), (1, 0, 1, 0)]:
+            eri[index] = 0.18 * r
+        coeffs.append(h2_coefficients(np.diag([-1.25, -0.48]), eri, 1. / r))
+
+    hydrogen.save_cache(hydrogen.get_cache_path(internuc_dist),
+                        internuc_dist, np.zeros(len(internuc_dist)), coeffs,
+                        -1.)
+
+
+def test_distance_job_through_store(tmpdir):
+    cache_dir = str(tmpdir.join('rhf_cache'))
+    write_cache(cache_dir, np.array([0.7, 1.4]))
+    store = ResultStore(str(tmpdir.join('results.sqlite')))
+
+    job = Job({'name': 'sweep', 'models': ['b'], 'seeds': [0, 1],
+               'distances': [0.7, 1.4], 'cache_dir': cache_dir,
+               'optimizer': {'name': 'spsa', 'n_iter': 5}})
+    results = job.run(store)
+
+    stored = store.results('sweep')
+    assert len(results) == len(stored) == 4
+    assert sorted((row['distance'], row['seed']) for row in stored) == \
+        [(0.7, 0), (0.7, 1), (1.4, 0), (1.4, 1)]
+
+    by_task = {(row['distance'], row['seed']): row for row in results}
+    for row in stored:
+        result = by_task[row['distance'], row['seed']]
+        assert row['optimizer'] == 'spsa' and row['model'] == 'b'
+        assert 0 <= row['fidelity'] <= 1
+        assert row['fidelity'] == result['fidelity']
+        assert row['cost_evals'] > 0
+        assert len(row['params']) == N_PARAMS['b']
+        np.testing.assert_array_equal(row['params'], result['params'])
+
+    assert store.results('other') == []
+
+
+def test_default_job_trains_on_hydrogen(tmpdir):
+    cache_dir = str(tmpdir.join('rhf_cache'))
+    write_cache(cache_dir, INTERNUC_DIST)
+
+    job = Job({'models': ['b'], 'cache_dir': cache_dir,
+               'optimizer': {'name': 'spsa', 'n_iter': 2}})
+    (distance, states), = job.training_sets()
+
+    assert distance is None
+    assert states.shape == (6, 16)
+
+    finished = []
+    result, = job.run(callback=finished.append)
+    assert result['distance'] is None
+    assert finished == [result]
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'num_ref': [2, 4]}, 'only 2 and 3 qubits'),
+    ({'optimizer': {'precision': 'half'}}, 'recision')])
+def test_job_rejects_invalid_circuits_on_load(spec, message):
+    with pytest.raises(Exception, match=message):
+        Job(dict(spec, states='unused.npy'))
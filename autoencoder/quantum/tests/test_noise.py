@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import numpy as np
+import pytest
+
+from circuit import Circuit
+from noise import NoiseModel, Trajectories
+from test_circuit import STATES, random_params
+
+
+def test_pool_is_reused_and_matches_serial():
+    circuit = Circuit(2, None, method='analytic')
+    params = random_params('a')
+    noise = NoiseModel(depolarizing=0.01, damping=0.01)
+    serial = Trajectories(circuit, noise, n_traj=8, chunk_size=4, seed=3)
+
+    with closing(Trajectories(circuit, noise, n_traj=8, chunk_size=4,
+                              processes=2, seed=3)) as pooled:
+        pools = []
+        for _ in range(2):
+            np.testing.assert_allclose(
+                pooled.probabilities('a', params, STATES),
+                serial.probabilities('a', params, STATES), atol=1e-12)
+            pools.append(pooled.pool)
+
+        assert pools[0] is not None and pools[0] is pools[1]
+
+    assert pooled.pool is None
+
+
+def test_shared_pool_is_left_running():
+    circuit = Circuit(2, None, method='analytic')
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        trajectories = Trajectories(circuit, NoiseModel(0.01), n_traj=4,
+                                    chunk_size=2, pool=pool)
+        trajectories.fidelity('b', random_params('b'), STATES)
+        trajectories.close()
+
+        assert trajectories.pool is pool
+        assert pool.submit(abs, -1).result() == 1
+
+
+def test_single_trajectory_is_rejected():
+    with pytest.raises(Exception, match='at least 2'):
+        Trajectories(Circuit(2, None, method='analytic'), NoiseModel(),
+                     n_traj=1)
+
+
+def test_standard_error_uses_sample_deviation():
+    circuit = Circuit(2, None, method='analytic')
+    params = random_params('a')
+    noise = NoiseModel(depolarizing=0.05)
+    trajectories = Trajectories(circuit, noise, n_traj=6, seed=4)
+
+    fidelity, error = trajectories.fidelity('a', params, STATES)
+    means = np.mean(Trajectories(circuit, noise, n_traj=6, seed=4)
+                    .probabilities('a', params, STATES), axis=1)
+
+    assert fidelity == pytest.approx(np.mean(means))
+    assert error == pytest.approx(np.std(means, ddof=1) / np.sqrt(6))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from circuit import Circuit
+from optimizers import Adam, Optimizer
+from test_circuit import random_params, random_states
+
+
+def test_adam_with_shots_follows_exact_adam():
+    circuit = Circuit(2, None, method='analytic')
+    states = random_states(6)
+    init = random_params('a')
+    bounds = [(0, 4 * np.pi)] * len(init)
+    fidelities = {}
+
+    for shots in (None, 1000):
+        adam = Adam()
+        adam.minimize(circuit, 'a', init, bounds, states, n_iter=50,
+                      rng=np.random.RandomState(0), shots=shots)
+        fidelities[shots] = circuit.batch_fidelity('a', adam.state['params'],
+                                                   states)
+
+    start = circuit.batch_fidelity('a', init, states)
+    assert fidelities[1000] - start > 0.8 * (fidelities[None] - start)
+
+
+def test_optimizer_requires_step():
+    class NoStep(Optimizer):
+        pass
+
+    with pytest.raises(TypeError):
+        NoStep()